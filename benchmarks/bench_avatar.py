@@ -0,0 +1,142 @@
+"""
+Avatar rendering benchmark with a regression gate.
+
+    python -m benchmarks.bench_avatar                    # compare with the saved baseline
+    python -m benchmarks.bench_avatar --save-baseline    # record a new baseline
+
+Baselines depend on the machine, record them on the same host the comparison runs on.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+from src import avatar
+from src.color import pick_stable_random
+from src.parse_chat_name import get_course_name, get_semester
+from tests.test_parse_chat_name import cases_course_groups
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+adversarial_titles: list[tuple[str, str | None]] = [
+    ("Introduction to Robot Operating System: Basics, Motion, and Vision and Some More Words To Overflow", "F25"),
+    ("Pneumonoultramicroscopicsilicovolcanoconiosis", "Sum24"),
+    ("Supercalifragilisticexpialidocious" * 3, None),
+    ("Аналитическая геометрия и линейная алгебра", "F25"),
+    ("Безопасность жизнедеятельности и основы военной подготовки для студентов", "Sum24"),
+    ("Достопримечательностями", None),
+    ("A", None),
+    ("Very long subtitle case", "Fall semester of the academic year two thousand twenty five"),
+]
+
+
+def corpus() -> list[tuple[str, str | None]]:
+    chat_names = sorted({chat_name for chat_name, _ in cases_course_groups})
+    return [(get_course_name(name), get_semester(name)) for name in chat_names] + adversarial_titles
+
+
+def reset_layout_caches() -> None:
+    # Every title is measured as if it was seen for the first time, loaded fonts are kept
+    avatar._text_width.cache_clear()
+    avatar._line_height.cache_clear()
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def measure(rounds: int) -> dict[str, float]:
+    stages: dict[str, list[float]] = {"background": [], "text": [], "encode": [], "total": []}
+    sizes: list[int] = []
+    peaks: list[int] = []
+
+    def timed(stage: str, fn: Callable):
+        started_at = time.perf_counter()
+        result = fn()
+        stages[stage].append(time.perf_counter() - started_at)
+        return result
+
+    # Warm up font loading so the first sample does not include it
+    avatar.get_avatar_bytes("Warm up", None, (0, 0, 0))
+
+    for _ in range(rounds):
+        for title, subtitle in corpus():
+            reset_layout_caches()
+            color = pick_stable_random(title)
+            started_at = time.perf_counter()
+            img = timed("background", lambda color=color: avatar.draw_background(color))
+            img = timed(
+                "text",
+                lambda img=img, title=title, subtitle=subtitle: avatar.draw_text(img, title, subtitle),
+            )
+            data = timed("encode", lambda img=img: avatar.encode_avatar(img))
+            stages["total"].append(time.perf_counter() - started_at)
+            sizes.append(len(data))
+
+    # Memory is traced in a separate pass, tracing slows the timed renders down
+    for title, subtitle in corpus():
+        reset_layout_caches()
+        tracemalloc.start()
+        avatar.get_avatar_bytes(title, subtitle, pick_stable_random(title))
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    results: dict[str, float] = {}
+    for stage, values in stages.items():
+        results[f"{stage}_p50_ms"] = percentile(values, 0.5) * 1000
+        results[f"{stage}_p95_ms"] = percentile(values, 0.95) * 1000
+    results["size_mean_kb"] = statistics.mean(sizes) / 1024
+    results["size_max_kb"] = max(sizes) / 1024
+    results["peak_python_memory_kb"] = max(peaks) / 1024
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    regressions = []
+    for name, value in results.items():
+        expected = baseline.get(name)
+        if expected is None or expected == 0:
+            continue
+        # Sub-millisecond timings are too noisy to gate on
+        if name.endswith("_ms") and value - expected < 1:
+            continue
+        if value > expected * (1 + threshold):
+            regressions.append(f"{name}: {value:.2f} > {expected:.2f} (+{(value / expected - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown, 0.2 = 20%%")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = measure(args.rounds)
+    for name, value in results.items():
+        print(f"{name:>24}: {value:10.2f}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --save-baseline first")
+        return 0
+
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
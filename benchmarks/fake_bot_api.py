@@ -0,0 +1,126 @@
+import asyncio
+import itertools
+import random
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+ADMIN_USER_ID = 1
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Chat Helper", "username": "chat_helper_bot"}
+
+
+class FakeBotAPI:
+    # Stand-in for the Bot API: serves queued updates and records what the bot does with them
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self._updates: asyncio.Queue[dict] = asyncio.Queue()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1_000_000)
+        self.enqueued_at: dict[tuple[int, int], float] = {}
+        self.deleted_at: dict[tuple[int, int], float] = {}
+        self.calls: dict[str, int] = defaultdict(int)
+        self.flood_errors = 0
+
+    def enqueue(self, update: dict) -> None:
+        update["update_id"] = next(self._update_ids)
+        message = update.get("message")
+        if message is not None:
+            self.enqueued_at[(message["chat"]["id"], message["message_id"])] = time.monotonic()
+        self._updates.put_nowait(update)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post())
+
+        if method != "getUpdates":
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.error_rate and random.random() < self.error_rate:
+                self.flood_errors += 1
+                return web.json_response(
+                    {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {self.retry_after}",
+                        "parameters": {"retry_after": self.retry_after},
+                    }
+                )
+
+        handler = getattr(self, f"method_{method}", None)
+        result = await handler(params) if handler is not None else True
+        return web.json_response({"ok": True, "result": result})
+
+    async def method_getUpdates(self, params: dict) -> list[dict]:
+        try:
+            first = await asyncio.wait_for(self._updates.get(), timeout=min(float(params.get("timeout", 0)), 1.0))
+        except TimeoutError:
+            return []
+        updates = [first]
+        while not self._updates.empty() and len(updates) < 100:
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    async def method_getMe(self, params: dict) -> dict:
+        return BOT_USER
+
+    async def method_deleteMessage(self, params: dict) -> bool:
+        self.deleted_at[(int(params["chat_id"]), int(params["message_id"]))] = time.monotonic()
+        return True
+
+    async def method_deleteMessages(self, params: dict) -> bool:
+        now = time.monotonic()
+        for message_id in params["message_ids"].strip("[]").split(","):
+            self.deleted_at[(int(params["chat_id"]), int(message_id))] = now
+        return True
+
+    async def method_getChatMember(self, params: dict) -> dict:
+        user_id = int(params["user_id"])
+        user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+        if user_id == ADMIN_USER_ID:
+            return {"status": "creator", "user": user, "is_anonymous": False}
+        return {"status": "member", "user": user}
+
+    async def method_getChatAdministrators(self, params: dict) -> list[dict]:
+        return [await self.method_getChatMember({"user_id": ADMIN_USER_ID})]
+
+    async def method_getChat(self, params: dict) -> dict:
+        return {
+            "id": int(params["chat_id"]),
+            "type": "supergroup",
+            "title": "Load test",
+            "accent_color_id": 0,
+            "max_reaction_count": 11,
+            "accepted_gift_types": {
+                "unlimited_gifts": False,
+                "limited_gifts": False,
+                "unique_gifts": False,
+                "premium_subscription": False,
+                "gifts_from_channels": False,
+            },
+        }
+
+    async def _message(self, params: dict, **fields) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "supergroup", "title": "Load test"},
+            "from": BOT_USER,
+            **fields,
+        }
+
+    async def method_sendMessage(self, params: dict) -> dict:
+        return await self._message(params, text=params.get("text", ""))
+
+    async def method_sendPhoto(self, params: dict) -> dict:
+        file_id = f"photo-{next(self._message_ids)}"
+        photo = [{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 640}]
+        return await self._message(params, photo=photo)
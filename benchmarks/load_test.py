@@ -0,0 +1,151 @@
+"""
+End-to-end load test of the bot against a local fake Bot API server.
+
+    python -m benchmarks.load_test --chats 20 --joins 50 --set-image 20 --latency 0.05 --error-rate 0.01
+
+The real dispatcher from src.bot polls the fake server, which records when every
+join/leave notification was deleted.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any
+
+from aiohttp import web
+
+from benchmarks.fake_bot_api import ADMIN_USER_ID, FakeBotAPI
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def join_update(chat_id: int, message_id: int, user_id: int) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"Student {user_id}"}
+    return {
+        "message": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup", "title": f"[F25] Course {-chat_id}"},
+            "from": user,
+            "new_chat_members": [user],
+        }
+    }
+
+
+def set_image_update(chat_id: int, message_id: int, title: str) -> dict:
+    text = f"/set_image\n{title}\nF25"
+    return {
+        "message": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup", "title": f"[F25] Course {-chat_id}"},
+            "from": {"id": ADMIN_USER_ID, "is_bot": False, "first_name": "Admin"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len("/set_image")}],
+        }
+    }
+
+
+async def run(args: argparse.Namespace) -> int:
+    api = FakeBotAPI(latency=args.latency, error_rate=args.error_rate)
+    runner = web.AppRunner(api.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+
+    os.environ.setdefault("TELEGRAM_API_TOKEN", "123456:load-test")
+    os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{args.port}"
+    # Fake chats must not end up in the real chat registry
+    registry_dir = tempfile.TemporaryDirectory()
+    os.environ["CHAT_REGISTRY_PATH"] = os.path.join(registry_dir.name, "chat_registry.sqlite3")
+    from src.bot import ALLOWED_UPDATES, bot, chat_registry, dp
+
+    handler_latencies: dict[str, list[float]] = defaultdict(list)
+
+    async def timing_middleware(handler, event, data: dict[str, Any]):
+        started_at = time.monotonic()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_latencies[data["handler"].callback.__name__].append(time.monotonic() - started_at)
+
+    dp.message.middleware(timing_middleware)
+    dp.callback_query.middleware(timing_middleware)
+
+    message_ids = iter(range(1, 10**9))
+    joins = [
+        join_update(-(1000 + chat), next(message_ids), 10_000 + chat * args.joins + join)
+        for join in range(args.joins)
+        for chat in range(args.chats)
+    ]
+    set_images = [
+        set_image_update(-(1000 + i % args.chats), next(message_ids), f"Load test course number {i}")
+        for i in range(args.set_image)
+    ]
+
+    polling = asyncio.create_task(dp.start_polling(bot, allowed_updates=ALLOWED_UPDATES, handle_signals=False))
+    started_at = time.monotonic()
+    # Interleave /set_image requests into the join storm, like a semester start
+    step = max(1, len(joins) // max(1, len(set_images)))
+    for i, update in enumerate(joins):
+        api.enqueue(update)
+        if i % step == 0 and set_images:
+            api.enqueue(set_images.pop())
+        if args.rate:
+            await asyncio.sleep(1 / args.rate)
+    for update in set_images:
+        api.enqueue(update)
+
+    join_keys = [(update["message"]["chat"]["id"], update["message"]["message_id"]) for update in joins]
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline and not all(key in api.deleted_at for key in join_keys):
+        await asyncio.sleep(0.05)
+    elapsed = time.monotonic() - started_at
+    total_updates = len(api.enqueued_at)
+
+    await dp.stop_polling()
+    await polling
+    await runner.cleanup()
+    chat_registry.close()
+    registry_dir.cleanup()
+
+    lags = [api.deleted_at[key] - api.enqueued_at[key] for key in join_keys if key in api.deleted_at]
+    missing = len(join_keys) - len(lags)
+    print(f"updates: {total_updates} in {elapsed:.2f}s ({total_updates / elapsed:.1f} updates/s)")
+    print(
+        f"deletion lag: p50={percentile(lags, 0.5) * 1000:.0f}ms p95={percentile(lags, 0.95) * 1000:.0f}ms "
+        f"max={max(lags, default=0) * 1000:.0f}ms missing={missing}"
+    )
+    for name, values in sorted(handler_latencies.items()):
+        print(
+            f"handler {name}: n={len(values)} p50={percentile(values, 0.5) * 1000:.1f}ms "
+            f"p95={percentile(values, 0.95) * 1000:.1f}ms"
+        )
+    print(f"api calls: {dict(sorted(api.calls.items()))} flood_errors={api.flood_errors}")
+    return 1 if missing else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--joins", type=int, default=30, help="join notifications per chat")
+    parser.add_argument("--set-image", type=int, default=10, help="number of /set_image requests")
+    parser.add_argument("--rate", type=float, default=0, help="updates per second to replay, 0 = all at once")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Bot API latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--timeout", type=float, default=120)
+    return asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
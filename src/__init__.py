@@ -0,0 +1,4 @@
+import time
+
+# Taken when the package is first imported, used to report how long the bot takes to start
+STARTED_AT = time.perf_counter()
@@ -1,6 +1,22 @@
+"""
+Entry point of the bot:
+
+    python -m src
+
+With BOT_WORKERS > 1 the worker processes are spawned, and each of them runs this module again as __mp_main__.
+"""
+
 import asyncio
+import contextlib
+
+
+def main() -> None:
+    # src.bot sets the bot up on import, so it is imported only here and every process does it exactly once
+    from src.bot import main as run_bot
+
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(run_bot())
 
-from src.bot import main
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,39 @@
+from functools import cache, lru_cache
+from typing import TYPE_CHECKING
+
+# Heavy imaging libraries are imported on first use, so importing the bot does not pay for them
+if TYPE_CHECKING:
+    import numpy as np
+    import PIL.ImageFont
+
+LOGO_PATH = "static/logo.png"
+FONT_PATH = "static/Rubik-Bold.ttf"
+ASSET_PATHS = (LOGO_PATH, FONT_PATH)
+FONT_SIZE_BIG = 124
+FONT_SIZE_SMALL = 74
+
+
+@lru_cache(maxsize=256)
+def load_font(path: str, size: int) -> "PIL.ImageFont.FreeTypeFont":
+    import PIL.ImageFont
+
+    return PIL.ImageFont.truetype(path, size)
+
+
+@cache
+def load_logo() -> "np.ndarray":
+    import numpy as np
+    import PIL.Image
+
+    with PIL.Image.open(LOGO_PATH) as logo:
+        return np.ascontiguousarray(np.array(logo)[:, :, :3])
+
+
+def warm_up() -> None:
+    from src.avatar import get_avatar_bytes
+
+    # Loads the assets and renders one avatar, so the first real request doesn't wait for imports and font loading
+    load_logo()
+    load_font(FONT_PATH, FONT_SIZE_BIG)
+    load_font(FONT_PATH, FONT_SIZE_SMALL)
+    get_avatar_bytes("Warm up", "F25", (0, 0, 0))
@@ -1,11 +1,63 @@
+import time
+from functools import lru_cache
+
 import numpy as np
 import PIL.Image
 import PIL.ImageDraw
 import PIL.ImageFont
 
-LOGO_IMG = np.array(PIL.Image.open("static/logo.png"))
-font_big: PIL.ImageFont.FreeTypeFont = PIL.ImageFont.truetype("static/Rubik-Bold.ttf", 124)
-font_small: PIL.ImageFont.FreeTypeFont = PIL.ImageFont.truetype("static/Rubik-Bold.ttf", 74)
+from src.assets import FONT_PATH, FONT_SIZE_BIG, FONT_SIZE_SMALL, load_font, load_logo
+from src.encoder import ENCODER_PROFILES, encode_avatar
+
+AVATAR_SIZE = 640
+_LOGO_LEVELS = np.arange(256, dtype=np.uint16)
+_CHANNELS = np.arange(3)
+
+
+def __getattr__(name: str) -> PIL.ImageFont.FreeTypeFont:
+    # Fonts are loaded on first access instead of at import time
+    if name == "font_big":
+        return load_font(FONT_PATH, FONT_SIZE_BIG)
+    if name == "font_small":
+        return load_font(FONT_PATH, FONT_SIZE_SMALL)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=16384)
+def _text_width(path: str, size: int, text: str) -> int:
+    _, _, w, _ = load_font(path, size).getbbox(text)
+    return w
+
+
+@lru_cache(maxsize=256)
+def _line_height(path: str, size: int) -> int:
+    _, _, _, h = load_font(path, size).getbbox("A")
+    return h
+
+
+def _wrap_text(path: str, size: int, text: str, max_width: int) -> list[str]:
+    lines = []
+    current_line: list[str] = []
+    for word in text.split():
+        current_line.append(word)
+        if _text_width(path, size, " ".join(current_line)) > max_width:
+            # If line width exceeds max_width, start a new line
+            current_line.pop()  # remove word causing overflow
+            lines.append(" ".join(current_line))
+            current_line = [word]  # start new line with current word
+    # Add any remaining words in the current line to lines
+    if current_line:
+        lines.append(" ".join(current_line))
+    return lines
+
+
+def _fit_text(path: str, size: int, text: str, max_width: int, max_height: int) -> list[str] | None:
+    lines = _wrap_text(path, size, text, max_width)
+    max_width_in_lines = max((_text_width(path, size, line) for line in lines), default=0)
+    text_height = _line_height(path, size) * len(lines)
+    if text_height <= max_height and max_width_in_lines <= max_width:
+        return lines
+    return None
 
 
 def print_text(
@@ -16,72 +68,51 @@ def print_text(
     max_width: int,
     max_height: int,
 ) -> PIL.Image.Image:
-    font_size = font.size
-    draw = PIL.ImageDraw.Draw(img)
-    current_font = PIL.ImageFont.truetype(font.path, font_size)
-
-    # Wrap text to fit within max_width and max_height
-    wrapped_text = text
-    trials = 1000
-    while trials:
-        trials -= 1
-        lines = []
-        words = wrapped_text.split()
-        current_line = []
-
-        for word in words:
-            current_line.append(word)
-            test_line = " ".join(current_line)
-            _, _, w, _ = current_font.getbbox(test_line)
-            if w > max_width:
-                # If line width exceeds max_width, start a new line
-                current_line.pop()  # remove word causing overflow
-                lines.append(" ".join(current_line))
-                current_line = [word]  # start new line with current word
-        # Add any remaining words in the current line to lines
-        if current_line:
-            lines.append(" ".join(current_line))
-
-        max_width_in_lines = 0
-
-        for line in lines:
-            _, _, w, _ = current_font.getbbox(line)
-            max_width_in_lines = max(w, max_width_in_lines)
-
-        # Calculate total height of the text block
-        _, _, _, line_height = current_font.getbbox("A")
-        text_height = line_height * len(lines)
-
-        if (text_height <= max_height) and (max_width_in_lines <= max_width):
-            # Draw the wrapped text
-            y_text = pos[1] - text_height // 2
-            for line in lines:
-                _, _, text_width, _ = current_font.getbbox(line)
-                x_text = pos[0] - text_width // 2
-                draw.text((x_text, y_text), line, font=current_font, fill=(255, 255, 255))
-                y_text += line_height
-            break
+    path = font.path
+    # Fitting is monotonic in font size, so binary search for the largest size that fits
+    low, high = 1, int(font.size)
+    font_size, lines = None, None
+    while low <= high:
+        middle = (low + high) // 2
+        fitted = _fit_text(path, middle, text, max_width, max_height)
+        if fitted is not None:
+            font_size, lines = middle, fitted
+            low = middle + 1
         else:
-            # Reduce font size if text block is too tall
-            font_size -= 1
-            current_font = PIL.ImageFont.truetype(font.path, font_size)
+            high = middle - 1
+
+    if font_size is None or lines is None:
+        return img
+
+    draw = PIL.ImageDraw.Draw(img)
+    current_font = load_font(path, font_size)
+    line_height = _line_height(path, font_size)
+    y_text = pos[1] - line_height * len(lines) // 2
+    for line in lines:
+        x_text = pos[0] - _text_width(path, font_size, line) // 2
+        draw.text((x_text, y_text), line, font=current_font, fill=(255, 255, 255))
+        y_text += line_height
 
     return img
 
 
-def generate_avatar(title: str, subtitle: str | None, color: tuple[int, int, int]) -> PIL.Image.Image:
-    img = np.zeros((640, 640, 3), np.uint32) + np.array(color)
+def draw_background(color: tuple[int, int, int]) -> PIL.Image.Image:
+    # Out of range components are clipped after blending, like the original per-pixel renderer did
+    channels = np.array(color, np.int64)
+    img = PIL.Image.new("RGB", (AVATAR_SIZE, AVATAR_SIZE), tuple(np.clip(channels, 0, 255).tolist()))
 
-    h = LOGO_IMG.shape[0]
-    w = LOGO_IMG.shape[1]
-    y0 = 105 - h // 2
-    x0 = (img.shape[1] - w) // 2
-    roi = img[y0 : y0 + h, x0 : x0 + w, :]
-    img[y0 : y0 + h, x0 : x0 + w, :] = roi * (255 - LOGO_IMG[:, :, :3]) // 255 + (LOGO_IMG[:, :, :3])
+    # The blend "color * (255 - logo) // 255 + logo" depends only on the logo level per channel,
+    # so compute it once for the 256 levels and index the logo with it instead of blending every pixel
+    blend_table = np.clip(channels[:, None] * (255 - _LOGO_LEVELS) // 255 + _LOGO_LEVELS, 0, 255).astype(np.uint8)
+    logo = load_logo()
+    h, w = logo.shape[0], logo.shape[1]
+    img.paste(PIL.Image.fromarray(blend_table[_CHANNELS, logo]), ((AVATAR_SIZE - w) // 2, 105 - h // 2))
+    return img
 
-    img = img.clip(0, 255).astype(np.uint8)
 
-    img = PIL.Image.fromarray(img)
+def draw_text(img: PIL.Image.Image, title: str, subtitle: str | None) -> PIL.Image.Image:
+    font_big = load_font(FONT_PATH, FONT_SIZE_BIG)
+    font_small = load_font(FONT_PATH, FONT_SIZE_SMALL)
     max_width = 600
     max_height = 300
     if subtitle is not None:
@@ -91,3 +122,23 @@ def generate_avatar(title: str, subtitle: str | None, color: tuple[int, int, int
         img = print_text(img, (640 // 2, 640 // 2), title, font_big, max_width, max_height)
 
     return img
+
+
+def generate_avatar(title: str, subtitle: str | None, color: tuple[int, int, int]) -> PIL.Image.Image:
+    return draw_text(draw_background(color), title, subtitle)
+
+
+def get_avatar_bytes(title: str, subtitle: str | None, color: tuple[int, int, int], profile: str = "final") -> bytes:
+    return encode_avatar(generate_avatar(title, subtitle, color), ENCODER_PROFILES[profile])
+
+
+def render_avatar(
+    title: str, subtitle: str | None, color: tuple[int, int, int], profile: str = "final"
+) -> tuple[bytes, float, float]:
+    # Only the requested profile is encoded, a preview doesn't pay for the slower final encoding.
+    # Durations are returned to be reported from worker pools
+    started_at = time.perf_counter()
+    picture = generate_avatar(title, subtitle, color)
+    rendered_at = time.perf_counter()
+    encoded = encode_avatar(picture, ENCODER_PROFILES[profile])
+    return encoded, rendered_at - started_at, time.perf_counter() - rendered_at
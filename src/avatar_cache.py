@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from src.assets import ASSET_PATHS
+from src.cache_backend import CacheBackend, cache_backend_from_env
+
+AvatarParams = tuple[str, str | None, tuple[int, int, int]]
+
+# Bump when the rendering or encoding changes in a way that alters the output bytes
+RENDERER_VERSION = 2
+
+
+@lru_cache(maxsize=1)
+def assets_digest() -> str:
+    digest = hashlib.sha256()
+    for path in ASSET_PATHS:
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def render_key(title: str, subtitle: str | None, color: tuple[int, int, int], profile: str = "final") -> str:
+    payload = json.dumps([RENDERER_VERSION, assets_digest(), title, subtitle, list(color), profile], ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+class AvatarCache:
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        store: CacheBackend | None = None,
+        max_file_ids: int = 4096,
+        max_params: int = 4096,
+    ):
+        self.max_bytes = max_bytes
+        # Optional second tier, shared between worker processes and restarts
+        self.store = store
+        # The store does disk I/O, a single thread keeps it off the event loop and its writes in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="avatar-cache")
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._in_flight: dict[str, asyncio.Future[bytes]] = {}
+        # Telegram file_id of an already uploaded photo, lets previews be sent again without uploading bytes
+        self.max_file_ids = max_file_ids
+        self._file_ids: OrderedDict[str, str] = OrderedDict()
+        # Render parameters by render key, so callback buttons only need to carry the key
+        self.max_params = max_params
+        self._params: OrderedDict[str, AvatarParams] = OrderedDict()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    async def _store_get(self, key: str) -> bytes | None:
+        if self.store is None:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.store.get, key)
+
+    async def _store_set(self, key: str, value: bytes) -> None:
+        if self.store is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.store.set, key, value)
+
+    async def get(self, key: str) -> bytes | None:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+
+        data = await self._store_get(f"avatar:{key}")
+        if data is not None:
+            self._remember(key, data)
+            self.store_hits += 1
+            return data
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        self._remember(key, data)
+        await self._store_set(f"avatar:{key}", data)
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        if len(data) > self.max_bytes:
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[bytes]]) -> bytes:
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+
+        # Concurrent requests for the same avatar wait for a single render
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key])
+
+        future: asyncio.Future[bytes] = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            data = await factory()
+            await self.put(key, data)
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so the error is not reported again when nobody else awaits it
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def get_file_id(self, key: str) -> str | None:
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            self._file_ids.move_to_end(key)
+        elif (stored := await self._store_get(f"file_id:{key}")) is not None:
+            file_id = stored.decode()
+            self._remember_entry(self._file_ids, key, file_id, self.max_file_ids)
+        return file_id
+
+    async def put_file_id(self, key: str, file_id: str) -> None:
+        self._remember_entry(self._file_ids, key, file_id, self.max_file_ids)
+        await self._store_set(f"file_id:{key}", file_id.encode())
+
+    async def get_params(self, key: str) -> AvatarParams | None:
+        params = self._params.get(key)
+        if params is not None:
+            self._params.move_to_end(key)
+        elif (stored := await self._store_get(f"params:{key}")) is not None:
+            title, subtitle, color = json.loads(stored)
+            params = title, subtitle, tuple(color)
+            self._remember_entry(self._params, key, params, self.max_params)
+        return params
+
+    async def put_params(self, key: str, params: AvatarParams) -> None:
+        self._remember_entry(self._params, key, params, self.max_params)
+        await self._store_set(f"params:{key}", json.dumps(params, ensure_ascii=False).encode())
+
+    def _remember_entry[V](self, entries: OrderedDict[str, V], key: str, value: V, max_entries: int) -> None:
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+
+    async def forget_file_id(self, key: str) -> None:
+        self._file_ids.pop(key, None)
+        if self.store is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.store.delete, f"file_id:{key}")
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.store_hits + self.misses
+        return {
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.store_hits) / lookups if lookups else 0.0,
+            "entries": len(self._memory),
+            "bytes": self._memory_bytes,
+            "file_ids": len(self._file_ids),
+            "params": len(self._params),
+        }
+
+
+def avatar_cache_from_env() -> AvatarCache:
+    cache = AvatarCache(
+        max_bytes=int(os.getenv("AVATAR_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+        store=cache_backend_from_env(),
+    )
+    logging.info(f"Avatar cache: {cache.max_bytes=} {cache.store=}")
+    return cache
@@ -0,0 +1,135 @@
+"""
+Pre-render default avatars of known course chats into a pack file, served by the bot without rendering.
+
+    python -m src.avatar_pack courses.txt --output avatars.pack
+
+The course list has one chat title per line, e.g. "[F25] Databases". Point AVATAR_PACK_PATH at the output.
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from src.avatar_cache import RENDERER_VERSION, assets_digest, render_key
+from src.color import pick_stable_random
+from src.parse_chat_name import parser as chat_name_parser
+
+MAGIC = b"CHAVPACK"
+# Magic, then the length of the JSON index, then the index, then the concatenated avatars
+HEADER = struct.Struct("<8sI")
+
+
+class AvatarPack:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_length = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an avatar pack")
+        index = json.loads(self._mmap[HEADER.size : HEADER.size + index_length])
+        if index["renderer_version"] != RENDERER_VERSION or index["assets_digest"] != assets_digest():
+            self.close()
+            raise ValueError(
+                f"Avatar pack {path} is stale: renderer_version={index['renderer_version']} "
+                f"assets_digest={index['assets_digest']}, expected {RENDERER_VERSION=} {assets_digest()=}"
+            )
+        data_offset = HEADER.size + index_length
+        self._entries: dict[str, tuple[int, int]] = {
+            key: (data_offset + offset, length) for key, (offset, length) in index["entries"].items()
+        }
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        offset, length = entry
+        return self._mmap[offset : offset + length]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, float]:
+        return {"entries": len(self._entries), "bytes": len(self._mmap), "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+def write_pack(path: str, avatars: dict[str, bytes]) -> None:
+    entries = {}
+    offset = 0
+    for key, data in avatars.items():
+        entries[key] = (offset, len(data))
+        offset += len(data)
+    index = json.dumps(
+        {"renderer_version": RENDERER_VERSION, "assets_digest": assets_digest(), "entries": entries}
+    ).encode()
+
+    # Written next to the target and renamed, so a running bot never maps a half-written pack
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(index)))
+        file.write(index)
+        for data in avatars.values():
+            file.write(data)
+    os.replace(tmp_path, path)
+
+
+def render_default(chat_name: str) -> tuple[str, bytes]:
+    from src.avatar import get_avatar_bytes
+
+    title, subtitle = chat_name_parser.parse(chat_name)
+    color = pick_stable_random(title)
+    return render_key(title, subtitle, color), get_avatar_bytes(title, subtitle, color, "final")
+
+
+def build_pack(chat_names: list[str], output: str, workers: int | None = None) -> int:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        avatars = dict(executor.map(render_default, dict.fromkeys(chat_names)))
+    write_pack(output, avatars)
+    return len(avatars)
+
+
+def avatar_pack_from_env() -> AvatarPack | None:
+    path = os.getenv("AVATAR_PACK_PATH")
+    if not path:
+        return None
+    try:
+        pack = AvatarPack(path)
+    except (OSError, ValueError) as e:
+        # The bot still works without the pack, avatars are just rendered on demand
+        logging.warning(f"Avatar pack is not used: {e}")
+        return None
+    logging.info(f"Avatar pack: {pack.path=} entries={len(pack)}")
+    return pack
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("courses_file", help="file with one chat title per line")
+    parser.add_argument("--output", default="avatars.pack")
+    parser.add_argument("--workers", type=int, default=None, help="render processes, all cores by default")
+    args = parser.parse_args()
+
+    lines = Path(args.courses_file).read_text().splitlines()
+    chat_names = [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+    count = build_pack(chat_names, args.output, args.workers)
+    logging.info(f"Avatar pack written: {args.output} with {count} avatars, {Path(args.output).stat().st_size} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,18 @@
 import asyncio
+import html
 import logging
 import os
-import re
-from io import BytesIO
+import resource
+import time
+from collections.abc import Coroutine
+from typing import Any
 
 from aiogram import Bot, Dispatcher, F, types
 from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ChatMemberStatus
 from aiogram.exceptions import TelegramBadRequest
-from aiogram.filters import Command, CommandObject
+from aiogram.filters import Command, CommandObject, or_f
 from aiogram.filters.callback_data import CallbackData
 from aiogram.types import (
     BufferedInputFile,
@@ -16,19 +20,55 @@ from aiogram.types import (
     ChatMemberUpdated,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
+    MessageEntity,
 )
-from aiogram.utils.formatting import Text
-from PIL.JpegPresets import presets
 
-from src.avatar import generate_avatar
-from src.color import pick_stable_random
+from src import STARTED_AT
+from src.avatar_cache import AvatarParams, avatar_cache_from_env, render_key
+from src.avatar_pack import avatar_pack_from_env
+from src.chat_member_cache import chat_member_cache_from_env
+from src.chat_registry import ChatRegistryMiddleware, chat_registry_from_env
+from src.color import parse_hex_color, pick_stable_random
+from src.deletion_queue import deletion_queue_from_env
+from src.encoder import avatar_filename
+from src.metrics import (
+    REGISTRY,
+    ApiMetricsMiddleware,
+    HandlerMetricsMiddleware,
+    monitor_event_loop_lag,
+    render_seconds,
+    start_metrics_server,
+)
 from src.parse_chat_name import get_course_name, get_semester
+from src.rate_limit import rate_limit_from_env
+from src.render_pool import RenderPoolBusy, render_avatar, render_pool_from_env
+from src.webhook import run_webhook
 
 API_TOKEN = os.getenv("TELEGRAM_API_TOKEN")
 PROXY_URL = os.getenv("TELEGRAM_PROXY_URL")
+# Base URL of a local or fake Bot API server, defaults to https://api.telegram.org
+API_URL = os.getenv("TELEGRAM_API_URL")
+# Public HTTPS URL of the webhook, the bot uses long polling when it is not set
+WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_KEEPALIVE_TIMEOUT = float(os.getenv("WEBHOOK_KEEPALIVE_TIMEOUT", "75"))
+# Number of worker processes, updates are routed to them by chat id when it is greater than 1
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+# Prometheus metrics are served on this port when it is set, sharded workers use the following ports
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Load fonts and the logo and render a sample avatar in the background right after startup
+AVATAR_WARM_UP = os.getenv("AVATAR_WARM_UP", "1") == "1"
+ALLOWED_UPDATES = ["message", "callback_query", "my_chat_member", "chat_member"]
 
 if not API_TOKEN:
     raise ValueError("TELEGRAM_API_TOKEN is not set")
+if WEBHOOK_URL and not WEBHOOK_SECRET:
+    # Without the secret anyone who finds the webhook URL can post forged updates
+    raise ValueError("TELEGRAM_WEBHOOK_SECRET is not set, it is required with TELEGRAM_WEBHOOK_URL")
 
 
 logging.basicConfig(level=logging.INFO)
@@ -37,10 +77,37 @@ if PROXY_URL:
     logging.info("Using proxy")
     session = AiohttpSession(proxy=PROXY_URL)
 else:
-    session = None
+    session = AiohttpSession()
+if API_URL:
+    logging.info(f"Using Bot API server at {API_URL}")
+    session.api = TelegramAPIServer.from_base(API_URL)
+rate_limiter = rate_limit_from_env()
+session.middleware(rate_limiter)
+# Registered after the rate limiter, so it measures the requests themselves without the time spent waiting
+session.middleware(ApiMetricsMiddleware())
 
 bot = Bot(token=API_TOKEN, session=session)
 dp = Dispatcher()
+render_pool = render_pool_from_env()
+avatar_cache = avatar_cache_from_env()
+avatar_pack = avatar_pack_from_env()
+deletion_queue = deletion_queue_from_env(bot)
+chat_member_cache = chat_member_cache_from_env(bot)
+chat_registry = chat_registry_from_env()
+dp.message.outer_middleware(ChatRegistryMiddleware(chat_registry))
+for observer in (dp.message, dp.callback_query, dp.my_chat_member, dp.chat_member):
+    observer.middleware(HandlerMetricsMiddleware())
+REGISTRY.register_stats("chat_helper_render_pool", render_pool.stats)
+REGISTRY.register_stats("chat_helper_avatar_cache", avatar_cache.stats)
+if avatar_pack is not None:
+    REGISTRY.register_stats("chat_helper_avatar_pack", avatar_pack.stats)
+REGISTRY.register_stats("chat_helper_chat_member_cache", chat_member_cache.stats)
+REGISTRY.register_stats("chat_helper_deletion_queue", deletion_queue.stats)
+REGISTRY.register_stats("chat_helper_rate_limit", rate_limiter.stats)
+REGISTRY.register_stats("chat_helper_chat_registry", lambda: {"chats": len(chat_registry.all())})
+process_stats: dict[str, float] = {}
+REGISTRY.register_stats("chat_helper_process", lambda: {**process_stats, "max_rss_bytes": _max_rss_bytes()})
+background_tasks: set[asyncio.Task] = set()
 image_generation_text = """Для генерации персонализированной аватарки отправьте сообщение:
 <pre><code>\
 /set_image
@@ -48,33 +115,146 @@ image_generation_text = """Для генерации персонализиро
 <i>Подзаголовок (опционально)</i>
 <i>Цвет в формате hex (опционально)</i>\
 </code></pre>"""
+render_pool_busy_text = "Сейчас генерируется слишком много аватарок, попробуйте ещё раз через минуту."
+
+
+def _max_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _start_background(coroutine: Coroutine[Any, Any, None]) -> None:
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
 
+async def _warm_up_avatars() -> None:
+    from src.assets import warm_up
 
+    started_at = time.perf_counter()
+    await render_pool.run(warm_up, block=True)
+    process_stats["warm_up_seconds"] = time.perf_counter() - started_at
+    logging.info(
+        f"Avatar assets warmed up in {process_stats['warm_up_seconds']:.2f}s, max_rss={_max_rss_bytes() // 2**20}MB"
+    )
+
+
+@dp.startup()
 async def on_startup():
-    logging.info("Bot is starting up...")
-    await bot.delete_webhook(drop_pending_updates=True)
+    process_stats["cold_start_seconds"] = time.perf_counter() - STARTED_AT
+    logging.info(
+        f"Bot is starting up... cold_start={process_stats['cold_start_seconds']:.2f}s "
+        f"max_rss={_max_rss_bytes() // 2**20}MB"
+    )
+    if AVATAR_WARM_UP:
+        _start_background(_warm_up_avatars())
+    if WEBHOOK_URL:
+        await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET, allowed_updates=ALLOWED_UPDATES)
+    else:
+        await bot.delete_webhook()
 
 
 class SetPhotoCallbackData(CallbackData, prefix="set_photo"):
-    pass
+    # Render key of the final avatar, its parameters are kept in the avatar cache
+    key: str
 
 
 class DeleteCallbackData(CallbackData, prefix="delete"):
     pass
 
 
-def _get_avatar_bytes(title: str, subtitle: str | None, color: tuple[int, int, int]) -> bytes:
-    picture = generate_avatar(title, subtitle, color)
-    bio = BytesIO()
-    picture.save(bio, "jpeg", quality=95, **presets["maximum"])
-    bio.seek(0)
-    return bio.read()
+def _params_from_caption(message: types.Message) -> AvatarParams | None:
+    # Buttons sent before callback data carried a render key: the parameters are the caption's first blockquote
+    caption = message.caption or ""
+    blockquote = next((e for e in message.caption_entities or [] if e.type == "blockquote"), None)
+    if blockquote is None:
+        return None
+    title, subtitle, color, *_ = [*MessageEntity.extract_from(blockquote, caption).splitlines(), None, None, None]
+    if not title:
+        return None
+    rgb = parse_hex_color(color or "") or pick_stable_random(title)
+    return title, subtitle or None, rgb
+
+
+async def _get_avatar_bytes(
+    title: str, subtitle: str | None, color: tuple[int, int, int], profile: str = "final", block: bool = False
+) -> bytes:
+    loop = asyncio.get_running_loop()
+
+    async def render() -> bytes:
+        # Rendering is CPU-bound, keep it off the event loop so deletions in other chats are not delayed
+        started_at = loop.time()
+        encoded, render_time, encode_time = await render_pool.run(
+            render_avatar, title, subtitle, color, profile, block=block
+        )
+        render_seconds.observe(render_time, stage="render")
+        render_seconds.observe(encode_time, stage="encode")
+        render_seconds.observe(loop.time() - started_at, stage="total")
+        logging.info(f"Avatar rendered: {profile=} render_pool.stats()={render_pool.stats()}")
+        return encoded
+
+    key = render_key(title, subtitle, color, profile)
+    # Default avatars of known courses are pre-rendered at deploy time
+    if avatar_pack is not None and (packed := avatar_pack.get(key)) is not None:
+        return packed
+    avatar_bytes = await avatar_cache.get_or_create(key, render)
+    logging.info(f"Avatar cache: avatar_cache.stats()={avatar_cache.stats()}")
+    return avatar_bytes
+
+
+async def _prerender_final(title: str, subtitle: str | None, color: tuple[int, int, int]) -> None:
+    # The set-photo button then finds the final photo in the cache. Skipped when the pool is busy, the button
+    # renders it itself in that case
+    try:
+        await _get_avatar_bytes(title, subtitle, color, "final")
+    except RenderPoolBusy:
+        logging.info("Render pool is busy, final avatar is not rendered ahead")
+
+
+async def _reply_avatar_photo(
+    message: types.Message, title: str, subtitle: str | None, color: tuple[int, int, int], **kwargs
+) -> types.Message:
+    key = render_key(title, subtitle, color, "preview")
+    file_id = await avatar_cache.get_file_id(key)
+    if file_id is not None:
+        try:
+            return await message.reply_photo(file_id, **kwargs)
+        except TelegramBadRequest as e:
+            logging.warning(f"Cached avatar file_id was rejected, uploading again: {e}")
+            await avatar_cache.forget_file_id(key)
+
+    avatar_bytes = await _get_avatar_bytes(title, subtitle, color, "preview")
+    sent = await message.reply_photo(BufferedInputFile(avatar_bytes, avatar_filename("preview")), **kwargs)
+    if sent.photo:
+        await avatar_cache.put_file_id(key, sent.photo[-1].file_id)
+    return sent
+
+
+async def _chat_has_photo(chat_id: int) -> bool:
+    record = await chat_registry.load(chat_id)
+    if record is not None and record.has_photo is not None:
+        return record.has_photo
+    chat = await bot.get_chat(chat_id)
+    await chat_registry.update(
+        chat_id, has_photo=chat.photo is not None, photo_file_id=chat.photo.big_file_id if chat.photo else None
+    )
+    return chat.photo is not None
+
+
+async def _set_default_chat_photo(chat: types.Chat) -> None:
+    title, subtitle = get_course_name(chat.full_name), get_semester(chat.full_name)
+    rgb = pick_stable_random(title)
+    avatar_bytes = await _get_avatar_bytes(title, subtitle, rgb, block=True)
+    await bot.set_chat_photo(chat_id=chat.id, photo=BufferedInputFile(avatar_bytes, avatar_filename()))
+    await chat_registry.update(chat.id, has_photo=True, avatar_key=render_key(title, subtitle, rgb))
 
 
 @dp.message(F.left_chat_member.is_not(None) | F.new_chat_members.is_not(None) | F.new_chat_photo.is_not(None))
 async def handle_message_with_deletable_actions(message: types.Message):
-    await message.delete()
-    logging.info(f"Message deleted: {message.chat.id=} message.message_id={message.message_id}")
+    # Join/leave storms are coalesced per chat and deleted in bulk to stay within flood limits
+    deletion_queue.add(message.chat.id, message.message_id)
+    logging.info(f"Message queued for deletion: {message.chat.id=} message.message_id={message.message_id}")
 
 
 @dp.message(Command("start"))
@@ -103,14 +283,11 @@ async def handle_set_image_command(message: types.Message, command: CommandObjec
     logging.info(
         f'handle_set_image_command: {message.chat.id=} chat.full_name="{message.chat.full_name}" message.from_user.id={message.from_user.id} message.from_user.username={message.from_user.username}'
     )
-    chat_member = await bot.get_chat_member(message.chat.id, message.from_user.id)
     if message.chat.id == message.from_user.id and not command.args:
         await message.answer(image_generation_text, reply_to_message_id=message.message_id, parse_mode="HTML")
         return
-    if (
-        message.chat.id == message.from_user.id
-        or chat_member.status == ChatMemberStatus.ADMINISTRATOR
-        or chat_member.status == ChatMemberStatus.CREATOR
+    if message.chat.id == message.from_user.id or await chat_member_cache.is_admin(
+        message.chat.id, message.from_user.id
     ):
         if command.args and len(command.args.splitlines()):
             splitted = command.args.splitlines()
@@ -124,10 +301,8 @@ async def handle_set_image_command(message: types.Message, command: CommandObjec
             subtitle = get_semester(message.chat.full_name)
 
         if color is not None:
-            color = color.lstrip("#")
-            try:
-                rgb = int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16)
-            except ValueError:
+            rgb = parse_hex_color(color)
+            if rgb is None:
                 await message.answer(
                     "Неверный формат цвета. Пожалуйста, используйте формат #RRGGBB, или не указывайте цвет. Будет использован случайный цвет.",
                     reply_to_message_id=message.message_id,
@@ -137,63 +312,80 @@ async def handle_set_image_command(message: types.Message, command: CommandObjec
             rgb = pick_stable_random(title)
         caption = f"""Текущие параметры:\
 <blockquote>\
-<b>{title}</b>
-{subtitle or ""}
+<b>{html.escape(title)}</b>
+{html.escape(subtitle or "")}
 #{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}\
 </blockquote>\n
 {image_generation_text}"""
 
-        avatar_bytes = _get_avatar_bytes(title, subtitle, rgb)
-
+        params_key = render_key(title, subtitle, rgb)
+        await avatar_cache.put_params(params_key, (title, subtitle, rgb))
         buttons = []
         if not message.chat.id == message.from_user.id:
             buttons.append(
-                [InlineKeyboardButton(text="Задать как аватар чата", callback_data=SetPhotoCallbackData().pack())]
+                [
+                    InlineKeyboardButton(
+                        text="Задать как аватар чата", callback_data=SetPhotoCallbackData(key=params_key).pack()
+                    )
+                ]
             )
             buttons.append(
                 [InlineKeyboardButton(text="Удалить это сообщение", callback_data=DeleteCallbackData().pack())]
             )
 
-        await message.reply_photo(
-            BufferedInputFile(avatar_bytes, "avatar.jpeg"),
-            caption=caption,
-            parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
-        )
+        try:
+            await _reply_avatar_photo(
+                message,
+                title,
+                subtitle,
+                rgb,
+                caption=caption,
+                parse_mode="HTML",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
+            )
+        except RenderPoolBusy:
+            await message.answer(render_pool_busy_text, reply_to_message_id=message.message_id)
+            return
+        if buttons:
+            _start_background(_prerender_final(title, subtitle, rgb))
     else:
         logging.info("No way...")
 
 
-@dp.callback_query(SetPhotoCallbackData.filter())
-async def handle_set_image_callback(callback_query: CallbackQuery):
+@dp.callback_query(or_f(SetPhotoCallbackData.filter(), F.data == SetPhotoCallbackData.__prefix__))
+async def handle_set_image_callback(callback_query: CallbackQuery, callback_data: SetPhotoCallbackData | None = None):
     assert callback_query.message
     logging.info(
         f"handle_set_image_callback: {callback_query.message.chat.id=} [{callback_query.message.chat.full_name}] {callback_query.from_user.id=} [{callback_query.from_user.username}]"
     )
 
     await callback_query.answer()
-    chat_member = await bot.get_chat_member(callback_query.message.chat.id, callback_query.from_user.id)
-    if chat_member.status == ChatMemberStatus.ADMINISTRATOR or chat_member.status == ChatMemberStatus.CREATOR:
+    if await chat_member_cache.is_admin(callback_query.message.chat.id, callback_query.from_user.id):
         assert isinstance(callback_query.message, types.Message)
-        as_html = Text.from_entities(
-            callback_query.message.caption or "", callback_query.message.caption_entities or []
-        ).as_html()
-        first_blockquote = re.search(r"<blockquote>(?P<content>.*?)</blockquote>", as_html, re.DOTALL | re.MULTILINE)
-        content = first_blockquote.group("content") if first_blockquote else ""
-        splitted = content.splitlines()
-
-        title, subtitle, color, *_ = (splitted + [None, None, None])[:3]
-
-        if color is not None:
-            color = color.lstrip("#")
-            rgb = int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16)
-        else:
-            rgb = pick_stable_random(title)
-
-        avatar_bytes = _get_avatar_bytes(title, subtitle, rgb)
+        params = await avatar_cache.get_params(callback_data.key) if callback_data else None
+        if params is None:
+            params = _params_from_caption(callback_query.message)
+        if params is None:
+            logging.warning(f"Unknown avatar parameters: {callback_query.data=}")
+            return
+        title, subtitle, rgb = params
+
+        try:
+            avatar_bytes = await _get_avatar_bytes(title, subtitle, rgb)
+        except RenderPoolBusy:
+            await callback_query.message.answer(render_pool_busy_text)
+            return
         await bot.set_chat_photo(
             chat_id=callback_query.message.chat.id,
-            photo=BufferedInputFile(avatar_bytes, "avatar.jpeg"),
+            photo=BufferedInputFile(avatar_bytes, avatar_filename()),
+        )
+        # Only default avatars are recorded, so regenerate_avatars leaves custom ones alone
+        chat_name = callback_query.message.chat.full_name
+        default_title = get_course_name(chat_name)
+        default_key = render_key(default_title, get_semester(chat_name), pick_stable_random(default_title))
+        key = render_key(title, subtitle, rgb)
+        await chat_registry.update(
+            callback_query.message.chat.id, has_photo=True, avatar_key=key if key == default_key else None
         )
         if callback_query.message.reply_to_message:
             await callback_query.message.reply_to_message.delete()
@@ -211,8 +403,7 @@ async def handle_delete_message(callback_query: CallbackQuery):
 
     await callback_query.answer()
     assert callback_query.message
-    chat_member = await bot.get_chat_member(callback_query.message.chat.id, callback_query.from_user.id)
-    if chat_member.status == ChatMemberStatus.ADMINISTRATOR or chat_member.status == ChatMemberStatus.CREATOR:
+    if await chat_member_cache.is_admin(callback_query.message.chat.id, callback_query.from_user.id):
         if not isinstance(callback_query.message, types.InaccessibleMessage):
             await callback_query.message.delete()
 
@@ -225,6 +416,12 @@ async def handle_bot_status_change(my_chat_member: ChatMemberUpdated):
 
     old_status = my_chat_member.old_chat_member.status
     new_status = my_chat_member.new_chat_member.status
+    chat_member_cache.update(my_chat_member.chat.id, my_chat_member.new_chat_member.user.id, new_status)
+    changes = {"title": my_chat_member.chat.title, "bot_status": new_status}
+    if new_status in (ChatMemberStatus.LEFT, ChatMemberStatus.KICKED):
+        # Photo changes are not seen while the bot is out of the chat
+        changes.update(has_photo=None, photo_file_id=None)
+    await chat_registry.update(my_chat_member.chat.id, **changes)
 
     # Check if bot was promoted to admin (from member, restricted, or left status)
     if (
@@ -232,26 +429,24 @@ async def handle_bot_status_change(my_chat_member: ChatMemberUpdated):
         and new_status == ChatMemberStatus.ADMINISTRATOR
     ):
         await bot.send_message(my_chat_member.chat.id, "✅ Я администратор, для дальнейшей работы всё уже настроено.")
-        chat = await bot.get_chat(my_chat_member.chat.id)
 
         # Set chat photo if none exists
-        if chat.photo is None:
-            title, subtitle = (
-                get_course_name(my_chat_member.chat.full_name),
-                get_semester(my_chat_member.chat.full_name),
-            )
-            rgb = pick_stable_random(title)
-            avatar_bytes = _get_avatar_bytes(title, subtitle, rgb)
+        if not await _chat_has_photo(my_chat_member.chat.id):
             try:
-                await bot.set_chat_photo(
-                    chat_id=my_chat_member.chat.id,
-                    photo=BufferedInputFile(avatar_bytes, "avatar.jpeg"),
-                )
+                await _set_default_chat_photo(my_chat_member.chat)
                 logging.info(f"Chat photo set for {my_chat_member.chat.id} after promotion to admin")
             except TelegramBadRequest as e:
                 logging.warning(f"Failed to set chat photo: {e}")
 
 
+@dp.chat_member()
+async def handle_chat_member_change(chat_member: ChatMemberUpdated):
+    # Keep cached permission checks in sync when admins are promoted or demoted
+    chat_member_cache.update(
+        chat_member.chat.id, chat_member.new_chat_member.user.id, chat_member.new_chat_member.status
+    )
+
+
 @dp.message(F.new_chat_members.is_not(None) & F.new_chat_members.any(F.id == bot.id))
 async def handle_bot_added_to_chat(message: types.Message):
     logging.info(
@@ -263,8 +458,8 @@ async def handle_bot_added_to_chat(message: types.Message):
         "Я бот от команды @one_zero_eight, удаляю уведомления о входе и выходе участников в чатах. "
         "Также я умею генерировать аватарку для чата (/set_image).\n\n"
     )
-    bot_chat_member = await bot.get_chat_member(message.chat.id, bot.id)
-    if bot_chat_member.status != ChatMemberStatus.ADMINISTRATOR:
+    bot_status = await chat_member_cache.get_status(message.chat.id, bot.id)
+    if bot_status != ChatMemberStatus.ADMINISTRATOR:
         text += (
             "Пожалуйста, назначьте меня администратором, чтобы я мог удалять уведомления о входе и выходе участников."
         )
@@ -272,21 +467,49 @@ async def handle_bot_added_to_chat(message: types.Message):
         text += "✅ Я администратор, для дальнейшей работы всё уже настроено."
 
     await message.answer(text)
-    chat = await bot.get_chat(message.chat.id)
 
-    if chat.photo is None and bot_chat_member.status == ChatMemberStatus.ADMINISTRATOR:
-        title, subtitle = get_course_name(message.chat.full_name), get_semester(message.chat.full_name)
-        rgb = pick_stable_random(title)
-        avatar_bytes = _get_avatar_bytes(title, subtitle, rgb)
-        await bot.set_chat_photo(
-            chat_id=message.chat.id,
-            photo=BufferedInputFile(avatar_bytes, "avatar.jpeg"),
-        )
+    if bot_status == ChatMemberStatus.ADMINISTRATOR and not await _chat_has_photo(message.chat.id):
+        await _set_default_chat_photo(message.chat)
+
+
+async def start_metrics(port: int) -> asyncio.Task:
+    if port:
+        await start_metrics_server(METRICS_HOST, port)
+    return asyncio.create_task(monitor_event_loop_lag())
 
 
 async def main() -> None:
-    await dp.start_polling(bot, allowed_updates=["message", "callback_query", "my_chat_member"])
+    if BOT_WORKERS > 1:
+        if WEBHOOK_URL:
+            raise ValueError("TELEGRAM_WEBHOOK_URL can't be used together with BOT_WORKERS > 1")
+        from src.sharding import run_sharded
+
+        await run_sharded(BOT_WORKERS, ALLOWED_UPDATES)
+        return
+
+    lag_monitor = await start_metrics(METRICS_PORT)
+    try:
+        if WEBHOOK_URL:
+            await run_webhook(
+                dp,
+                bot,
+                host=WEBHOOK_HOST,
+                port=WEBHOOK_PORT,
+                path=WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                keepalive_timeout=WEBHOOK_KEEPALIVE_TIMEOUT,
+            )
+        else:
+            await dp.start_polling(bot, allowed_updates=ALLOWED_UPDATES)
+    finally:
+        lag_monitor.cancel()
+        await deletion_queue.close()
+        render_pool.shutdown()
+        chat_registry.close()
 
 
 if __name__ == "__main__":
+    if BOT_WORKERS > 1:
+        # Spawned workers would import this module a second time, as src.bot
+        raise SystemExit("Run the bot with `python -m src` when BOT_WORKERS > 1")
     asyncio.run(main())
@@ -0,0 +1,152 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Protocol
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> bytes | None: ...
+
+    def set(self, key: str, value: bytes) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Access times are only refreshed when older than this, so most hits don't write
+ACCESS_RESOLUTION = 60.0
+
+
+class DirectoryBackend:
+    # Least recently used files are removed once the directory grows over max_bytes. Reads bump the modification
+    # time; writes of other processes are only counted at the next cleanup, so the limit is approximate. Only files
+    # with the suffix are counted and removed, the directory may hold anything else
+    suffix = ".cache"
+
+    def __init__(
+        self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, access_resolution: float = ACCESS_RESOLUTION
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.access_resolution = access_resolution
+        self._bytes = self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key.replace(':', '-')}{self.suffix}"
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            if path.stat().st_mtime < time.time() - self.access_resolution:
+                os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, key: str, value: bytes) -> None:
+        # Write to a temporary file first, so other processes never read a partial file
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(value)
+        os.replace(tmp_path, path)
+        self._bytes += len(value)
+        if self._bytes > self.max_bytes:
+            self._bytes = self._evict()
+
+    def _evict(self) -> int:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        kept = 0
+        for _, size, path in sorted(files, reverse=True):
+            if kept + size > self.max_bytes:
+                Path(path).unlink(missing_ok=True)
+            else:
+                kept += size
+        return kept
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+
+class SQLiteBackend:
+    # Least recently used rows are deleted once the values take more than max_bytes
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, access_resolution: float = ACCESS_RESOLUTION):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.access_resolution = access_resolution
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets several worker processes read while one of them writes
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(cache)")]
+        if columns and "accessed_at" not in columns:
+            # A cache without the access times can't be evicted, start over
+            self._connection.execute("DROP TABLE cache")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        # Kept up to date by this process and recounted after each eviction, like the directory backend's total
+        self._bytes = self._total()
+
+    def _total(self) -> int:
+        (total,) = self._connection.execute("SELECT total(size) FROM cache").fetchone()
+        return int(total)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            row = self._connection.execute("SELECT value, accessed_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row and row[1] < time.time() - self.access_resolution:
+                self._connection.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            replaced = self._connection.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._bytes += len(value) - (replaced[0] if replaced else 0)
+            if self._bytes > self.max_bytes:
+                self._connection.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM ("
+                    "SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS kept FROM cache"
+                    ") WHERE kept > ?)",
+                    (self.max_bytes,),
+                )
+                self._bytes = self._total()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            rows = self._connection.execute("DELETE FROM cache WHERE key = ? RETURNING size", (key,)).fetchall()
+            self._bytes -= sum(size for (size,) in rows)
+
+
+def cache_backend_from_env() -> CacheBackend | None:
+    kind = os.getenv("CACHE_BACKEND", "memory")
+    path = os.getenv("CACHE_BACKEND_PATH")
+    # Kept for compatibility with the avatar cache directory setting
+    if kind == "memory" and os.getenv("AVATAR_CACHE_DIR"):
+        kind, path = "directory", os.getenv("AVATAR_CACHE_DIR")
+
+    if kind == "memory":
+        return None
+    if not path:
+        raise ValueError(f"CACHE_BACKEND_PATH is not set for {kind} cache backend")
+    max_bytes = int(os.getenv("CACHE_BACKEND_MAX_BYTES", str(DEFAULT_MAX_BYTES)))
+    logging.info(f"Cache backend: {kind=} {path=} {max_bytes=}")
+    if kind == "directory":
+        return DirectoryBackend(path, max_bytes)
+    if kind == "sqlite":
+        return SQLiteBackend(path, max_bytes)
+    raise ValueError(f"Unknown cache backend: {kind}")
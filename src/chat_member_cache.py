@@ -0,0 +1,101 @@
+import logging
+import os
+import time
+
+from aiogram import Bot
+from aiogram.enums import ChatMemberStatus
+
+ADMIN_STATUSES = (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.CREATOR)
+
+
+class ChatMemberCache:
+    def __init__(self, bot: Bot, ttl: float = 60.0, preload_admins: bool = False, max_entries: int = 10000):
+        self.bot = bot
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.preload_admins = preload_admins
+        self._statuses: dict[tuple[int, int], tuple[ChatMemberStatus, float]] = {}
+        self._admins: dict[int, tuple[frozenset[int], float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh_status(self, chat_id: int, user_id: int) -> ChatMemberStatus | None:
+        cached = self._statuses.get((chat_id, user_id))
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        return None
+
+    def _fresh_admins(self, chat_id: int) -> frozenset[int] | None:
+        cached = self._admins.get(chat_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        return None
+
+    async def get_status(self, chat_id: int, user_id: int) -> ChatMemberStatus:
+        status = self._fresh_status(chat_id, user_id)
+        if status is not None:
+            self.hits += 1
+            return status
+        self.misses += 1
+        chat_member = await self.bot.get_chat_member(chat_id, user_id)
+        self.update(chat_id, user_id, ChatMemberStatus(chat_member.status))
+        return ChatMemberStatus(chat_member.status)
+
+    async def is_admin(self, chat_id: int, user_id: int) -> bool:
+        status = self._fresh_status(chat_id, user_id)
+        if status is not None:
+            self.hits += 1
+            return status in ADMIN_STATUSES
+
+        admins = self._fresh_admins(chat_id)
+        if admins is not None:
+            self.hits += 1
+            return user_id in admins
+
+        if self.preload_admins and chat_id < 0:
+            # One getChatAdministrators request answers the check for every member of the chat
+            self.misses += 1
+            return user_id in await self.load_admins(chat_id)
+
+        return await self.get_status(chat_id, user_id) in ADMIN_STATUSES
+
+    async def load_admins(self, chat_id: int) -> frozenset[int]:
+        administrators = await self.bot.get_chat_administrators(chat_id)
+        expires_at = time.monotonic() + self.ttl
+        admins = frozenset(admin.user.id for admin in administrators)
+        self._admins[chat_id] = (admins, expires_at)
+        for admin in administrators:
+            self._statuses[(chat_id, admin.user.id)] = (ChatMemberStatus(admin.status), expires_at)
+        return admins
+
+    def update(self, chat_id: int, user_id: int, status: ChatMemberStatus) -> None:
+        if len(self._statuses) >= self.max_entries:
+            now = time.monotonic()
+            self._statuses = {key: value for key, value in self._statuses.items() if value[1] > now}
+        self._statuses[(chat_id, user_id)] = (status, time.monotonic() + self.ttl)
+        admins = self._fresh_admins(chat_id)
+        if admins is not None and (user_id in admins) != (status in ADMIN_STATUSES):
+            # Admin list changed, fetch it again on the next check
+            del self._admins[chat_id]
+
+    def invalidate(self, chat_id: int, user_id: int | None = None) -> None:
+        if user_id is None:
+            self._admins.pop(chat_id, None)
+            for key in [key for key in self._statuses if key[0] == chat_id]:
+                del self._statuses[key]
+        else:
+            self._statuses.pop((chat_id, user_id), None)
+            self._admins.pop(chat_id, None)
+
+    def stats(self) -> dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._statuses), "chats": len(self._admins)}
+
+
+def chat_member_cache_from_env(bot: Bot) -> ChatMemberCache:
+    cache = ChatMemberCache(
+        bot,
+        ttl=float(os.getenv("CHAT_MEMBER_CACHE_TTL", "60")),
+        preload_admins=os.getenv("CHAT_ADMINS_PRELOAD", "0") == "1",
+    )
+    logging.info(f"Chat member cache: {cache.ttl=} {cache.preload_admins=}")
+    return cache
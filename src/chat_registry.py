@@ -0,0 +1,145 @@
+import asyncio
+import dataclasses
+import logging
+import os
+import sqlite3
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+from src.parse_chat_name import parser
+
+
+@dataclass
+class ChatRecord:
+    chat_id: int
+    title: str | None = None
+    course: str | None = None
+    semester: str | None = None
+    bot_status: str | None = None
+    # None when it is not known yet whether the chat has a photo
+    has_photo: bool | None = None
+    # Render key of the default avatar the bot set, None once the photo is a custom or uploaded one
+    avatar_key: str | None = None
+    photo_file_id: str | None = None
+    updated_at: float = 0.0
+
+
+FIELDS = [field.name for field in dataclasses.fields(ChatRecord)]
+
+
+class ChatRegistry:
+    # Chats are kept in memory for reads, every change is written through to SQLite. Other processes (the bot's
+    # workers, the regenerate CLI) write to the same file, so a write only touches the columns it changed
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # A single thread runs every statement, so writes land in the order they were made
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-registry")
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS chats (
+                chat_id INTEGER PRIMARY KEY,
+                title TEXT,
+                course TEXT,
+                semester TEXT,
+                bot_status TEXT,
+                has_photo INTEGER,
+                avatar_key TEXT,
+                photo_file_id TEXT,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._chats: dict[int, ChatRecord] = {}
+        for row in self._connection.execute(f"SELECT {', '.join(FIELDS)} FROM chats"):
+            record = _record_from_row(row)
+            self._chats[record.chat_id] = record
+
+    def get(self, chat_id: int) -> ChatRecord | None:
+        return self._chats.get(chat_id)
+
+    def all(self) -> list[ChatRecord]:
+        return list(self._chats.values())
+
+    async def load(self, chat_id: int) -> ChatRecord | None:
+        # Re-reads the row, for decisions that must see changes made by other processes
+        row = await asyncio.get_running_loop().run_in_executor(self._executor, self._read, chat_id)
+        if row is None:
+            return self._chats.get(chat_id)
+        record = _record_from_row(row)
+        self._chats[chat_id] = record
+        return record
+
+    def _read(self, chat_id: int) -> tuple | None:
+        return self._connection.execute(
+            f"SELECT {', '.join(FIELDS)} FROM chats WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+
+    async def update(self, chat_id: int, **changes) -> ChatRecord:
+        if "title" in changes and changes["title"] is not None:
+            changes["course"], changes["semester"] = parser.parse(changes["title"])
+        changes["updated_at"] = time.time()
+        record = dataclasses.replace(self._chats.get(chat_id) or ChatRecord(chat_id), **changes)
+        self._chats[chat_id] = record
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._write, chat_id, changes)
+        return record
+
+    def _write(self, chat_id: int, changes: dict[str, Any]) -> None:
+        columns = list(changes)
+        self._connection.execute(
+            f"INSERT INTO chats (chat_id, {', '.join(columns)}) VALUES (?{', ?' * len(columns)}) "
+            f"ON CONFLICT(chat_id) DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in columns)}",
+            (chat_id, *changes.values()),
+        )
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        self._connection.close()
+
+
+def _record_from_row(row: tuple) -> ChatRecord:
+    record = ChatRecord(*row)
+    if record.has_photo is not None:
+        record.has_photo = bool(record.has_photo)
+    return record
+
+
+class ChatRegistryMiddleware(BaseMiddleware):
+    # Outer message middleware: records title and photo changes, even of messages no handler is interested in
+    def __init__(self, registry: ChatRegistry):
+        self.registry = registry
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: dict[str, Any],
+    ) -> Any:
+        changes: dict[str, Any] = {}
+        record = self.registry.get(event.chat.id)
+        if event.chat.title is not None and (record is None or record.title != event.chat.title):
+            changes["title"] = event.chat.title
+        if event.new_chat_photo:
+            changes.update(has_photo=True, photo_file_id=event.new_chat_photo[-1].file_id)
+            if event.from_user is None or event.from_user.id != data["bot"].id:
+                # Uploaded by a person, the default avatar is gone
+                changes["avatar_key"] = None
+        elif event.delete_chat_photo:
+            changes.update(has_photo=False, photo_file_id=None, avatar_key=None)
+        if changes:
+            await self.registry.update(event.chat.id, **changes)
+        return await handler(event, data)
+
+
+def chat_registry_from_env() -> ChatRegistry:
+    registry = ChatRegistry(os.getenv("CHAT_REGISTRY_PATH", "data/chat_registry.sqlite3"))
+    logging.info(f"Chat registry: {registry.path=} chats={len(registry.all())}")
+    return registry
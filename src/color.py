@@ -1,6 +1,9 @@
 import colorsys
+import re
 from zlib import crc32
 
+HEX_COLOR = re.compile(r"^[0-9a-fA-F]{6}$")
+
 
 def pick_stable_random(to_hash: str):
     hash_value = crc32(to_hash.encode()) & 0xFFFFFFFF
@@ -12,3 +15,10 @@ def pick_stable_random(to_hash: str):
     b *= 255
 
     return int(r), int(g), int(b)
+
+
+def parse_hex_color(value: str) -> tuple[int, int, int] | None:
+    value = value.strip().removeprefix("#")
+    if not HEX_COLOR.match(value):
+        return None
+    return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
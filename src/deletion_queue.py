@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+# Bot API limit for deleteMessages
+MAX_MESSAGES_PER_REQUEST = 100
+
+
+class DeletionQueue:
+    # Flood limits are waited out by the session's rate limit middleware, not here
+    def __init__(self, bot: Bot, window: float = 1.0):
+        self.bot = bot
+        self.window = window
+        self._pending: dict[int, list[int]] = {}
+        self._flush_tasks: dict[int, asyncio.Task] = {}
+        self.flushes = 0
+        self.requests = 0
+        self.deleted = 0
+        self.failed = 0
+
+    def add(self, chat_id: int, message_id: int) -> None:
+        self._pending.setdefault(chat_id, []).append(message_id)
+        if chat_id not in self._flush_tasks:
+            self._flush_tasks[chat_id] = asyncio.create_task(self._flush_later(chat_id))
+
+    async def _flush_later(self, chat_id: int) -> None:
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            del self._flush_tasks[chat_id]
+        await self.flush(chat_id)
+
+    async def flush(self, chat_id: int) -> None:
+        message_ids = self._pending.pop(chat_id, [])
+        if not message_ids:
+            return
+        self.flushes += 1
+        for i in range(0, len(message_ids), MAX_MESSAGES_PER_REQUEST):
+            chunk = message_ids[i : i + MAX_MESSAGES_PER_REQUEST]
+            try:
+                await self.bot.delete_messages(chat_id, chunk)
+                self.requests += 1
+                self.deleted += len(chunk)
+            except TelegramAPIError as e:
+                logging.warning(f"Bulk delete failed, deleting one by one: {chat_id=} {e}")
+                await self._delete_one_by_one(chat_id, chunk)
+        logging.info(f"Messages deleted: {chat_id=} coalesced={len(message_ids)} {message_ids=}")
+
+    async def _delete_one_by_one(self, chat_id: int, message_ids: list[int]) -> None:
+        for message_id in message_ids:
+            try:
+                await self.bot.delete_message(chat_id, message_id)
+                self.deleted += 1
+            except TelegramAPIError as e:
+                self.failed += 1
+                logging.warning(f"Failed to delete message: {chat_id=} {message_id=} {e}")
+            self.requests += 1
+
+    async def close(self) -> None:
+        for task in list(self._flush_tasks.values()):
+            task.cancel()
+        await asyncio.gather(*(self.flush(chat_id) for chat_id in list(self._pending)))
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "pending": sum(len(ids) for ids in self._pending.values()),
+            "flushes": self.flushes,
+            "requests": self.requests,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "coalesced_per_flush": self.deleted / self.flushes if self.flushes else 0.0,
+        }
+
+
+def deletion_queue_from_env(bot: Bot) -> DeletionQueue:
+    return DeletionQueue(bot, window=float(os.getenv("DELETION_WINDOW_SECONDS", "1.0")))
@@ -0,0 +1,72 @@
+import threading
+from dataclasses import dataclass
+from io import BytesIO
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import PIL.Image
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    format: str = "jpeg"
+    quality: int = 90
+    # JPEG chroma subsampling: 0 = 4:4:4, 1 = 4:2:2, 2 = 4:2:0
+    subsampling: int = 0
+    optimize: bool = False
+    progressive: bool = False
+    # When set, the largest quality that fits into this many bytes is used
+    max_bytes: int | None = None
+
+
+# Telegram recompresses chat photos anyway, so the quality above 90 is not worth the size
+ENCODER_PROFILES = {
+    "preview": EncoderProfile(quality=80, subsampling=2),
+    "final": EncoderProfile(quality=90, subsampling=0, optimize=True, max_bytes=200 * 1024),
+}
+MIN_QUALITY = 30
+
+_buffers = threading.local()
+
+
+def _save(picture: "PIL.Image.Image", profile: EncoderProfile, quality: int) -> bytes:
+    # Encoding reuses one buffer per thread instead of allocating a new one for every avatar
+    buffer: BytesIO | None = getattr(_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _buffers.buffer = BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    if profile.format == "webp":
+        picture.save(buffer, "webp", quality=quality)
+    else:
+        picture.save(
+            buffer,
+            "jpeg",
+            quality=quality,
+            subsampling=profile.subsampling,
+            optimize=profile.optimize,
+            progressive=profile.progressive,
+        )
+    return buffer.getvalue()
+
+
+def encode_avatar(picture: "PIL.Image.Image", profile: EncoderProfile = ENCODER_PROFILES["final"]) -> bytes:
+    data = _save(picture, profile, profile.quality)
+    if profile.max_bytes is None or len(data) <= profile.max_bytes:
+        return data
+
+    # Size shrinks with quality, so binary search for the best quality under the limit
+    low, high = MIN_QUALITY, profile.quality - 1
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = _save(picture, profile, middle)
+        if len(candidate) <= profile.max_bytes:
+            best, low = candidate, middle + 1
+        else:
+            high = middle - 1
+    return best if best is not None else _save(picture, profile, MIN_QUALITY)
+
+
+def avatar_filename(profile: str = "final") -> str:
+    return f"avatar.{ENCODER_PROFILES[profile].format}"
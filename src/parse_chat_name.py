@@ -1,24 +1,62 @@
+import os
 import re
+from collections.abc import Iterable
+from functools import lru_cache
+from typing import NamedTuple
 
 
-def get_course_name(chat_name: str) -> str:
-    # Regex pattern to remove the prefix like [S24], [F23], etc., and any suffix after " / "
-    match = re.match(r"\[.*?\]\s*([^\s/]+.*?)(\s*/.*)?$", chat_name)
-    if match:
-        course_name = match.group(1).strip()
-        # Remove "Students" if it appears at the end
-        if course_name.endswith("Students"):
-            course_name = course_name.rsplit(" ", 1)[0].strip()
-        # Remove any trailing parentheses and their content
-        course_name = re.sub(r"\s*\(.*?\)$", "", course_name).strip()
-        return course_name
-    return chat_name  # Return as is if pattern doesn't match
+class ParsedChatName(NamedTuple):
+    course: str
+    semester: str | None
 
 
-def get_semester(chat_name: str) -> str | None:
-    match = re.match(r"\[.*?\]", chat_name)
+class ChatNameParser:
+    def __init__(self, prefix: str = r"\[.*?\]", suffixes: Iterable[str] = ("Students",), memo_size: int = 4096):
+        # The prefix is the semester tag like [S24], [F23], etc.; a course name ending with one of the suffixes
+        # loses its last word
+        self.prefix = prefix
+        self.suffixes = tuple(suffixes)
+        self._prefix = re.compile(prefix)
+        # Removes the prefix and any suffix after " / "
+        self._course = re.compile(rf"{prefix}\s*([^\s/]+.*?)(\s*/.*)?$")
+        self._parentheses = re.compile(r"\s*\(.*?\)$")
+        # The same titles come with every event of a chat
+        self.parse = lru_cache(maxsize=memo_size)(self._parse)
+
+    def _parse(self, chat_name: str) -> ParsedChatName:
+        return ParsedChatName(self._parse_course(chat_name), self._parse_semester(chat_name))
+
+    def _parse_course(self, chat_name: str) -> str:
+        match = self._course.match(chat_name)
+        if match:
+            course_name = match.group(1).strip()
+            if course_name.endswith(self.suffixes):
+                course_name = course_name.rsplit(" ", 1)[0].strip()
+            # Remove any trailing parentheses and their content
+            return self._parentheses.sub("", course_name).strip()
+        return chat_name  # Return as is if pattern doesn't match
+
+    def _parse_semester(self, chat_name: str) -> str | None:
+        match = self._prefix.match(chat_name)
+        if match:
+            return match.group(0).strip("[] ").capitalize()
+        return None
+
+    def parse_many(self, chat_names: Iterable[str]) -> list[ParsedChatName]:
+        return [self.parse(chat_name) for chat_name in chat_names]
+
 
-    if match:
-        return match.group(0).strip("[] ").capitalize()
+def chat_name_parser_from_env() -> ChatNameParser:
+    suffixes = os.getenv("CHAT_NAME_SUFFIXES", "Students")
+    return ChatNameParser(suffixes=[suffix.strip() for suffix in suffixes.split(",") if suffix.strip()])
 
-    return None
+
+parser = chat_name_parser_from_env()
+
+
+def get_course_name(chat_name: str) -> str:
+    return parser.parse(chat_name).course
+
+
+def get_semester(chat_name: str) -> str | None:
+    return parser.parse(chat_name).semester
@@ -0,0 +1,164 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from enum import IntEnum
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+# Removing join/leave notifications is what users notice, avatar uploads can wait
+METHOD_PRIORITIES = {
+    "deleteMessage": Priority.HIGH,
+    "deleteMessages": Priority.HIGH,
+    "answerCallbackQuery": Priority.HIGH,
+    "sendPhoto": Priority.LOW,
+    "setChatPhoto": Priority.LOW,
+}
+
+
+class PriorityTokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._counter = itertools.count()
+        self._wakeup: asyncio.Task | None = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _delay(self) -> float:
+        self._refill()
+        delay = max(0.0, self._paused_until - time.monotonic())
+        if self._tokens < 1:
+            delay = max(delay, (1 - self._tokens) / self.rate)
+        return delay
+
+    @property
+    def idle(self) -> bool:
+        return not self._waiters and self._delay() == 0 and self._tokens >= self.burst
+
+    async def acquire(self, priority: Priority = Priority.NORMAL) -> None:
+        if not self._waiters and self._delay() == 0:
+            self._tokens -= 1
+            return
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self._schedule()
+        await future
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _schedule(self) -> None:
+        if self._wakeup is None or self._wakeup.done():
+            self._wakeup = asyncio.create_task(self._release_waiters())
+
+    async def _release_waiters(self) -> None:
+        # Waiters are released one token at a time, the highest priority first
+        while self._waiters:
+            delay = self._delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._tokens -= 1
+                future.set_result(None)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        global_burst: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 20.0,
+        max_retries: int = 3,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = PriorityTokenBucket(global_rate, global_burst)
+        self._chats: dict[int | str, PriorityTokenBucket] = {}
+        self._waits: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=256))
+        self.retries = 0
+
+    def _chat_bucket(self, chat_id: int | str) -> PriorityTokenBucket:
+        if chat_id not in self._chats:
+            if len(self._chats) > 1000:
+                # Drop buckets of chats that are quiet again, a fresh bucket behaves the same
+                self._chats = {key: bucket for key, bucket in self._chats.items() if not bucket.idle}
+            self._chats[chat_id] = PriorityTokenBucket(self.chat_rate, self.chat_burst)
+        return self._chats[chat_id]
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        priority = METHOD_PRIORITIES.get(name, Priority.NORMAL)
+        chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            started_at = time.monotonic()
+            if chat_id is not None:
+                await self._chat_bucket(chat_id).acquire(priority)
+            await self._global.acquire(priority)
+            self._waits[name].append(time.monotonic() - started_at)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logging.warning(f"Flood limit hit: {name=} {chat_id=} retry_after={e.retry_after}")
+                # Hold back every request to this chat (or every request at all) until the limit is lifted
+                (self._chat_bucket(chat_id) if chat_id is not None else self._global).pause(e.retry_after)
+
+    def stats(self) -> dict[str, float]:
+        # Flat numeric keys, so they are exported as gauges, e.g. deleteMessages_wait_p95
+        result: dict[str, float] = {"retries": self.retries}
+        for name, waits in self._waits.items():
+            ordered = sorted(waits)
+            result[f"{name}_count"] = len(ordered)
+            result[f"{name}_wait_p50"] = ordered[len(ordered) // 2]
+            result[f"{name}_wait_p95"] = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return result
+
+
+def rate_limit_from_env() -> RateLimitMiddleware:
+    # Every worker process has its own buckets, the global limit is shared between them (chats are not)
+    workers = max(1, int(os.getenv("BOT_WORKERS", "1")))
+    global_rate = float(os.getenv("API_GLOBAL_RATE", "30")) / workers
+    middleware = RateLimitMiddleware(
+        global_rate=global_rate,
+        global_burst=global_rate,
+        chat_rate=float(os.getenv("API_CHAT_RATE", "1")),
+        chat_burst=float(os.getenv("API_CHAT_BURST", "20")),
+    )
+    logging.info(f"Bot API rate limits: {middleware.global_rate=} {middleware.chat_rate=} {middleware.chat_burst=}")
+    return middleware
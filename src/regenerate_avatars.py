@@ -0,0 +1,137 @@
+"""
+Regenerate default avatars of managed chats, e.g. after the logo, font or palette changed.
+
+    python -m src.regenerate_avatars -100123 -100456
+    python -m src.regenerate_avatars --chats-file chats.txt --dry-run out/
+    python -m src.regenerate_avatars --all-registered
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import BufferedInputFile
+
+from src.avatar_cache import render_key
+from src.chat_registry import ChatRegistry, chat_registry_from_env
+from src.color import pick_stable_random
+from src.encoder import avatar_filename
+from src.parse_chat_name import parser as chat_name_parser
+
+
+def render_final(title: str, subtitle: str | None, color: tuple[int, int, int]) -> bytes:
+    from src.avatar import get_avatar_bytes
+
+    return get_avatar_bytes(title, subtitle, color, "final")
+
+
+def positive_rate(value: str) -> float:
+    rate = float(value)
+    if not rate > 0:
+        raise argparse.ArgumentTypeError(f"rate must be greater than 0, got {value}")
+    return rate
+
+
+def read_chat_ids(args: argparse.Namespace, registry: ChatRegistry) -> list[int]:
+    chat_ids = list(args.chat_ids)
+    if args.all_registered:
+        chat_ids.extend(
+            record.chat_id for record in registry.all() if record.bot_status == ChatMemberStatus.ADMINISTRATOR
+        )
+    if args.chats_file:
+        for line in Path(args.chats_file).read_text().splitlines():
+            if line.strip() and not line.lstrip().startswith("#"):
+                chat_ids.append(int(line.split()[0]))
+    return list(dict.fromkeys(chat_ids))
+
+
+async def regenerate(args: argparse.Namespace) -> int:
+    if args.dry_run:
+        # Dry runs only render, they need neither the bot token nor the bot's setup
+        logging.basicConfig(level=logging.INFO)
+        bot, chat_registry = None, chat_registry_from_env()
+    else:
+        from src.bot import bot, chat_registry
+
+    chat_ids = read_chat_ids(args, chat_registry)
+    if not chat_ids:
+        logging.error("No chats given")
+        return 1
+
+    jobs: list[tuple[int, str, str, str | None, tuple[int, int, int]]] = []
+    for chat_id in chat_ids:
+        record = await chat_registry.load(chat_id)
+        chat_name = record.title if record is not None else None
+        has_photo = record.has_photo if record is not None else None
+        if (chat_name is None or has_photo is None) and bot is not None:
+            try:
+                chat = await bot.get_chat(chat_id)
+            except TelegramAPIError as e:
+                logging.warning(f"Skipping {chat_id=}: {e}")
+                continue
+            chat_name, has_photo = chat.full_name, chat.photo is not None
+        if chat_name is None:
+            logging.warning(f"Skipping {chat_id=}: not in the chat registry")
+            continue
+        title, subtitle = chat_name_parser.parse(chat_name)
+        color = pick_stable_random(title)
+        key = render_key(title, subtitle, color)
+        if not args.force:
+            if record is not None and record.avatar_key == key:
+                logging.info(f"Unchanged, skipping: {chat_id=} {chat_name=}")
+                continue
+            # avatar_key is only set while the chat shows a default avatar the bot set itself
+            if has_photo and (record is None or record.avatar_key is None):
+                logging.info(f"Custom photo, skipping: {chat_id=} {chat_name=}")
+                continue
+        jobs.append((chat_id, key, title, subtitle, color))
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # Every avatar is rendered in parallel, photos are pushed one by one at a paced rate below
+        renders = [loop.run_in_executor(executor, render_final, *job[2:]) for job in jobs]
+
+        failed = 0
+        for (chat_id, key, title, subtitle, _), render in zip(jobs, renders, strict=True):
+            avatar_bytes = await render
+            if args.dry_run:
+                out_dir = Path(args.dry_run)
+                out_dir.mkdir(parents=True, exist_ok=True)
+                (out_dir / f"{chat_id}_{avatar_filename()}").write_bytes(avatar_bytes)
+                logging.info(f"Rendered {chat_id=} {title=} {subtitle=}")
+                continue
+            try:
+                assert bot is not None
+                await bot.set_chat_photo(chat_id=chat_id, photo=BufferedInputFile(avatar_bytes, avatar_filename()))
+                await chat_registry.update(chat_id, has_photo=True, avatar_key=key)
+                logging.info(f"Chat photo updated: {chat_id=} {title=} {subtitle=}")
+            except TelegramAPIError as e:
+                failed += 1
+                logging.warning(f"Failed to set chat photo: {chat_id=} {e}")
+            await asyncio.sleep(1 / args.rate)
+
+    if bot is not None:
+        await bot.session.close()
+    logging.info(f"Done: {len(jobs)} to update, {len(chat_ids) - len(jobs)} skipped, {failed} failed")
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("chat_ids", nargs="*", type=int)
+    parser.add_argument("--chats-file", help="file with one chat id per line")
+    parser.add_argument("--all-registered", action="store_true", help="all chats where the bot is an admin")
+    parser.add_argument("--workers", type=int, default=None, help="render processes, all cores by default")
+    parser.add_argument("--rate", type=positive_rate, default=1.0, help="chat photo updates per second")
+    parser.add_argument("--force", action="store_true", help="also update unchanged and custom avatars")
+    parser.add_argument("--dry-run", metavar="DIR", help="write avatars to DIR instead of setting them")
+    return asyncio.run(regenerate(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class RenderPoolBusy(Exception):
+    pass
+
+
+class RenderPool:
+    def __init__(self, kind: str = "thread", max_workers: int = 2, max_queue: int = 8):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown render executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Executor | None = None
+        # Capacity = jobs being rendered + jobs waiting for a free worker
+        self._capacity = asyncio.Semaphore(max_workers + max_queue)
+        self._pending = 0
+        self._rejected = 0
+        self._latencies: deque[float] = deque(maxlen=256)
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="render")
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    async def run[T](self, fn: Callable[..., T], *args, block: bool = False) -> T:
+        # block=False rejects the job when the pool is saturated, block=True waits for a free slot (backpressure)
+        if not block and self._capacity.locked():
+            self._rejected += 1
+            raise RenderPoolBusy(f"Render queue is full ({self.queue_depth} waiting)")
+
+        await self._capacity.acquire()
+        self._pending += 1
+        submitted_at = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self._pending -= 1
+            self._capacity.release()
+            self._latencies.append(time.perf_counter() - submitted_at)
+
+    def stats(self) -> dict[str, float]:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "queue_depth": self.queue_depth,
+            "pending": self._pending,
+            "rejected": self._rejected,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def render_avatar(
+    title: str, subtitle: str | None, color: tuple[int, int, int], profile: str
+) -> tuple[bytes, float, float]:
+    # Runs in the pool's workers, so numpy and Pillow are first imported there and never on the event loop
+    from src import avatar
+
+    return avatar.render_avatar(title, subtitle, color, profile)
+
+
+def render_pool_from_env() -> RenderPool:
+    pool = RenderPool(
+        kind=os.getenv("AVATAR_RENDER_EXECUTOR", "thread"),
+        max_workers=int(os.getenv("AVATAR_RENDER_WORKERS", "2")),
+        max_queue=int(os.getenv("AVATAR_RENDER_MAX_QUEUE", "8")),
+    )
+    logging.info(f"Avatar render pool: {pool.kind=} {pool.max_workers=} {pool.max_queue=}")
+    return pool
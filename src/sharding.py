@@ -0,0 +1,169 @@
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import signal
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.queues import Queue
+
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError
+from aiogram.types import Update
+
+
+def update_chat_id(update: Update) -> int:
+    if update.message is not None:
+        return update.message.chat.id
+    if update.callback_query is not None and update.callback_query.message is not None:
+        return update.callback_query.message.chat.id
+    if update.my_chat_member is not None:
+        return update.my_chat_member.chat.id
+    if update.chat_member is not None:
+        return update.chat_member.chat.id
+    return 0
+
+
+def shard_for(chat_id: int, shards: int) -> int:
+    return chat_id % shards
+
+
+class ChatSerializer:
+    # Runs jobs of one chat one after another, while different chats are processed concurrently
+    def __init__(self):
+        self._queues: dict[int, asyncio.Queue[Callable[[], Awaitable[None]]]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, chat_id: int, job: Callable[[], Awaitable[None]]) -> None:
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = asyncio.Queue()
+            task = asyncio.create_task(self._consume(chat_id, queue))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        queue.put_nowait(job)
+
+    async def _consume(self, chat_id: int, queue: asyncio.Queue[Callable[[], Awaitable[None]]]) -> None:
+        while not queue.empty():
+            job = queue.get_nowait()
+            try:
+                await job()
+            except Exception:
+                logging.exception(f"Failed to process update: {chat_id=}")
+        del self._queues[chat_id]
+
+    async def join(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+
+class UpdateForwarder:
+    # Hands updates over to the worker queues. Every shard has its own buffer and forwarding task, so a worker that
+    # falls behind only holds up its own chats
+    def __init__(self, queues: list[Queue], buffer_size: int = 10000):
+        self.queues = queues
+        self._buffers: list[asyncio.Queue[Update]] = [asyncio.Queue(maxsize=buffer_size) for _ in queues]
+        # Putting into a full queue blocks its thread, one per shard keeps the others going
+        self._executor = ThreadPoolExecutor(max_workers=len(queues), thread_name_prefix="shard-forwarder")
+        self._tasks = [
+            asyncio.create_task(self._forward(queue, buffer)) for queue, buffer in zip(queues, self._buffers)
+        ]
+
+    async def put(self, update: Update) -> None:
+        # Updates of one chat always go to the same worker, which keeps their order. Only waits when the shard is a
+        # whole buffer behind
+        await self._buffers[shard_for(update_chat_id(update), len(self.queues))].put(update)
+
+    async def _forward(self, queue: Queue, buffer: asyncio.Queue[Update]) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            update = await buffer.get()
+            try:
+                await loop.run_in_executor(self._executor, queue.put, update.model_dump_json(exclude_unset=True))
+            finally:
+                buffer.task_done()
+
+    async def close(self) -> None:
+        # Buffered updates are already confirmed to Telegram, so they are handed over before stopping
+        try:
+            for buffer in self._buffers:
+                await buffer.join()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._executor.shutdown(wait=False)
+
+
+def _worker_main(index: int, queue: Queue) -> None:
+    # Ctrl+C reaches the whole process group, workers stop when the ingress process sends them None instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, queue))
+
+
+async def _run_worker(index: int, queue: Queue) -> None:
+    from src.bot import METRICS_PORT, bot, chat_registry, deletion_queue, dp, render_pool, start_metrics
+
+    logging.info(f"Bot worker {index} started")
+    lag_monitor = await start_metrics(METRICS_PORT + 1 + index if METRICS_PORT else 0)
+    loop = asyncio.get_running_loop()
+    serializer = ChatSerializer()
+    # Run the startup and shutdown handlers the way polling does in a single process
+    await dp.emit_startup(bot=bot)
+    try:
+        while (data := await loop.run_in_executor(None, queue.get)) is not None:
+            update = Update.model_validate_json(data, context={"bot": bot})
+            serializer.submit(update_chat_id(update), lambda update=update: dp.feed_update(bot, update))
+        await serializer.join()
+    finally:
+        await dp.emit_shutdown(bot=bot)
+        lag_monitor.cancel()
+        await deletion_queue.close()
+        render_pool.shutdown()
+        chat_registry.close()
+        await bot.session.close()
+        logging.info(f"Bot worker {index} stopped")
+
+
+async def run_sharded(workers: int, allowed_updates: list[str], poll_timeout: int = 30) -> None:
+    from src.bot import bot
+
+    # Spawned workers import the bot from scratch instead of inheriting the ingress event loop
+    context = multiprocessing.get_context("spawn")
+    queues: list[Queue] = [context.Queue(maxsize=1000) for _ in range(workers)]
+    processes = [
+        context.Process(target=_worker_main, args=(index, queue), name=f"bot-worker-{index}")
+        for index, queue in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+
+    await bot.delete_webhook()
+    forwarder = UpdateForwarder(queues)
+    offset: int | None = None
+    try:
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset,
+                    timeout=poll_timeout,
+                    allowed_updates=allowed_updates,
+                    request_timeout=poll_timeout + 10,
+                )
+            except (TelegramNetworkError, TelegramAPIError) as e:
+                logging.warning(f"Failed to fetch updates: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                await forwarder.put(update)
+                offset = update.update_id + 1
+    finally:
+        await forwarder.close()
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            process.join(timeout=30)
+        if offset is not None:
+            with contextlib.suppress(TelegramNetworkError, TelegramAPIError):
+                await bot.get_updates(offset=offset, timeout=0, allowed_updates=allowed_updates)
+        await bot.session.close()
@@ -0,0 +1,39 @@
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, path: str, secret_token: str) -> web.Application:
+    app = web.Application()
+    # Updates are acknowledged right away and processed in background tasks,
+    # requests with a wrong X-Telegram-Bot-Api-Secret-Token header are rejected with 401
+    SimpleRequestHandler(dispatcher=dp, bot=bot, handle_in_background=True, secret_token=secret_token).register(
+        app, path=path
+    )
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    host: str,
+    port: int,
+    path: str,
+    secret_token: str,
+    keepalive_timeout: float = 75.0,
+) -> None:
+    app = create_webhook_app(dp, bot, path, secret_token)
+    # Telegram keeps connections to the webhook open, so don't close idle ones too eagerly
+    runner = web.AppRunner(app, keepalive_timeout=keepalive_timeout)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    logging.info(f"Webhook server is listening on {host}:{port}{path}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,123 @@
+from io import BytesIO
+
+import numpy as np
+import PIL.Image
+import PIL.ImageDraw
+import PIL.ImageFont
+import pytest
+
+from src.avatar import font_big, font_small, generate_avatar, print_text
+from src.color import pick_stable_random
+from src.encoder import ENCODER_PROFILES, EncoderProfile, encode_avatar
+from src.parse_chat_name import get_course_name, get_semester
+from tests.test_parse_chat_name import cases_course_groups
+
+LOGO_IMG = np.array(PIL.Image.open("static/logo.png"))
+
+
+# Original renderer, kept as a reference to guard pixel-exact output of the optimized one
+def reference_print_text(img, pos, text, font, max_width, max_height):
+    font_size = font.size
+    draw = PIL.ImageDraw.Draw(img)
+    current_font = PIL.ImageFont.truetype(font.path, font_size)
+    trials = 1000
+    while trials:
+        trials -= 1
+        lines = []
+        current_line = []
+        for word in text.split():
+            current_line.append(word)
+            _, _, w, _ = current_font.getbbox(" ".join(current_line))
+            if w > max_width:
+                current_line.pop()
+                lines.append(" ".join(current_line))
+                current_line = [word]
+        if current_line:
+            lines.append(" ".join(current_line))
+
+        max_width_in_lines = 0
+        for line in lines:
+            _, _, w, _ = current_font.getbbox(line)
+            max_width_in_lines = max(w, max_width_in_lines)
+
+        _, _, _, line_height = current_font.getbbox("A")
+        text_height = line_height * len(lines)
+
+        if (text_height <= max_height) and (max_width_in_lines <= max_width):
+            y_text = pos[1] - text_height // 2
+            for line in lines:
+                _, _, text_width, _ = current_font.getbbox(line)
+                x_text = pos[0] - text_width // 2
+                draw.text((x_text, y_text), line, font=current_font, fill=(255, 255, 255))
+                y_text += line_height
+            break
+        else:
+            font_size -= 1
+            current_font = PIL.ImageFont.truetype(font.path, font_size)
+    return img
+
+
+def reference_generate_avatar(title, subtitle, color):
+    img = np.zeros((640, 640, 3), np.uint32) + np.array(color)
+    h, w = LOGO_IMG.shape[0], LOGO_IMG.shape[1]
+    y0 = 105 - h // 2
+    x0 = (img.shape[1] - w) // 2
+    roi = img[y0 : y0 + h, x0 : x0 + w, :]
+    img[y0 : y0 + h, x0 : x0 + w, :] = roi * (255 - LOGO_IMG[:, :, :3]) // 255 + (LOGO_IMG[:, :, :3])
+    img = PIL.Image.fromarray(img.clip(0, 255).astype(np.uint8))
+    img = reference_print_text(img, (320, 320), title, font_big, 600, 300)
+    if subtitle is not None:
+        img = reference_print_text(img, (320, 520), subtitle, font_small, 600, 74)
+    return img
+
+
+adversarial_cases = [
+    ("Introduction to Robot Operating System: Basics, Motion, and Vision and Some More Words To Overflow", "F25"),
+    ("Pneumonoultramicroscopicsilicovolcanoconiosis", "Sum24"),
+    ("Аналитическая геометрия и линейная алгебра", "F25"),
+    ("Достопримечательностями", None),
+    ("A", None),
+    ("", None),
+    ("Very long subtitle case", "Fall semester of the academic year two thousand twenty five"),
+]
+
+render_cases = [
+    (get_course_name(chat_name), get_semester(chat_name)) for chat_name, _ in cases_course_groups
+] + adversarial_cases
+
+
+@pytest.mark.parametrize(("title", "subtitle"), render_cases)
+def test_generate_avatar_matches_reference(title: str, subtitle: str | None):
+    color = pick_stable_random(title)
+    expected = np.asarray(reference_generate_avatar(title, subtitle, color))
+    actual = np.asarray(generate_avatar(title, subtitle, color))
+    assert np.array_equal(actual, expected)
+
+
+def test_print_text_keeps_size_when_text_fits():
+    img = PIL.Image.new("RGB", (640, 640))
+    expected = reference_print_text(img.copy(), (320, 320), "OS", font_small, 600, 300)
+    actual = print_text(img.copy(), (320, 320), "OS", font_small, 600, 300)
+    assert np.array_equal(np.asarray(actual), np.asarray(expected))
+
+
+@pytest.mark.parametrize("color", [(0, 0, 0), (255, 255, 255), (255, 0, 128), (1, 254, 127), (-1, 2, 300)])
+def test_logo_compositing_matches_reference(color: tuple[int, int, int]):
+    expected = np.asarray(reference_generate_avatar("", None, color))
+    actual = np.asarray(generate_avatar("", None, color))
+    assert np.array_equal(actual, expected)
+
+
+@pytest.mark.parametrize("profile", [*ENCODER_PROFILES.values(), EncoderProfile(format="webp", quality=80)])
+def test_encoder_profiles_produce_decodable_images(profile: EncoderProfile):
+    data = encode_avatar(generate_avatar("Databases", "S24", (10, 20, 30)), profile)
+    decoded = PIL.Image.open(BytesIO(data))
+    assert decoded.format == profile.format.upper()
+    assert decoded.size == (640, 640)
+
+
+def test_encoder_respects_size_target():
+    picture = generate_avatar("Introduction to Robot Operating System", "F25", (200, 40, 90))
+    unlimited = encode_avatar(picture, EncoderProfile(quality=95))
+    limited = encode_avatar(picture, EncoderProfile(quality=95, max_bytes=len(unlimited) // 2))
+    assert len(limited) <= len(unlimited) // 2
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+
+from src.avatar_cache import AvatarCache, render_key
+from src.cache_backend import DirectoryBackend, SQLiteBackend
+
+
+def test_render_key_depends_on_inputs():
+    key = render_key("Databases", "S24", (1, 2, 3))
+    assert key == render_key("Databases", "S24", (1, 2, 3))
+    assert key != render_key("Databases", None, (1, 2, 3))
+    assert key != render_key("Databases", "S24", (1, 2, 4))
+
+
+def test_memory_budget_evicts_least_recently_used():
+    async def scenario():
+        cache = AvatarCache(max_bytes=10)
+        await cache.put("a", b"12345")
+        await cache.put("b", b"12345")
+        assert await cache.get("a") == b"12345"
+        await cache.put("c", b"12345")
+        assert await cache.get("b") is None
+        assert await cache.get("a") == b"12345"
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+@pytest.mark.parametrize("backend", ["directory", "sqlite"])
+def test_store_tier_is_shared_between_instances(tmp_path, backend: str):
+    def make_store():
+        if backend == "directory":
+            return DirectoryBackend(str(tmp_path))
+        return SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+
+    async def scenario():
+        writer = AvatarCache(store=make_store())
+        await writer.put("key", b"avatar")
+        await writer.put_file_id("key", "file-id")
+        await writer.put_params("key", ("Кириллица & <b>", None, (1, 2, 3)))
+
+        reader = AvatarCache(store=make_store())
+        assert await reader.get("key") == b"avatar"
+        assert await reader.get_file_id("key") == "file-id"
+        assert await reader.get_params("key") == ("Кириллица & <b>", None, (1, 2, 3))
+        assert reader.stats()["store_hits"] == 1
+        await reader.forget_file_id("key")
+        assert await AvatarCache(store=make_store()).get_file_id("key") is None
+
+    asyncio.run(scenario())
+
+
+def test_get_or_create_renders_once_for_concurrent_requests():
+    renders = 0
+
+    async def render() -> bytes:
+        nonlocal renders
+        renders += 1
+        await asyncio.sleep(0.01)
+        return b"avatar"
+
+    async def scenario():
+        cache = AvatarCache()
+        results = await asyncio.gather(*(cache.get_or_create("key", render) for _ in range(3)))
+        assert results == [b"avatar"] * 3
+        assert await cache.get_or_create("key", render) == b"avatar"
+
+    asyncio.run(scenario())
+    assert renders == 1
+
+
+def test_file_ids_are_bounded():
+    async def scenario():
+        cache = AvatarCache(max_file_ids=2)
+        await cache.put_file_id("a", "file-a")
+        await cache.put_file_id("b", "file-b")
+        assert await cache.get_file_id("a") == "file-a"
+        await cache.put_file_id("c", "file-c")
+        assert await cache.get_file_id("b") is None
+        await cache.forget_file_id("a")
+        assert await cache.get_file_id("a") is None
+        assert await cache.get_file_id("c") == "file-c"
+
+    asyncio.run(scenario())
+
+
+def test_params_are_bounded_separately_from_file_ids():
+    async def scenario():
+        cache = AvatarCache(max_file_ids=1, max_params=2)
+        await cache.put_file_id("a", "file-a")
+        await cache.put_params("a", ("A", None, (0, 0, 0)))
+        await cache.put_params("b", ("B", None, (0, 0, 0)))
+        assert await cache.get_params("a") == ("A", None, (0, 0, 0))
+        await cache.put_params("c", ("C", None, (0, 0, 0)))
+        assert await cache.get_params("b") is None
+        assert await cache.get_file_id("a") == "file-a"
+        assert cache.stats()["params"] == 2
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("backend", ["directory", "sqlite"])
+def test_store_evicts_least_recently_used_over_size_limit(tmp_path, backend: str):
+    if backend == "directory":
+        store = DirectoryBackend(str(tmp_path), max_bytes=10, access_resolution=0)
+    else:
+        store = SQLiteBackend(str(tmp_path / "cache.sqlite3"), max_bytes=10, access_resolution=0)
+    for key in ("a", "b"):
+        store.set(key, b"1234")
+        time.sleep(0.01)
+    assert store.get("a") == b"1234"
+    time.sleep(0.01)
+    store.set("c", b"1234")
+    assert store.get("b") is None
+    assert store.get("a") == b"1234"
+    assert store.get("c") == b"1234"
+
+
+def test_sqlite_store_only_refreshes_stale_access_times(tmp_path):
+    store = SQLiteBackend(str(tmp_path / "cache.sqlite3"), access_resolution=60)
+    store.set("a", b"1234")
+    store._connection.execute("UPDATE cache SET accessed_at = accessed_at - 30")
+    (before,) = store._connection.execute("SELECT accessed_at FROM cache").fetchone()
+    assert store.get("a") == b"1234"
+    assert store._connection.execute("SELECT accessed_at FROM cache").fetchone() == (before,)
+    store._connection.execute("UPDATE cache SET accessed_at = accessed_at - 60")
+    store.get("a")
+    assert store._connection.execute("SELECT accessed_at FROM cache").fetchone()[0] > before
+    store.set("a", b"12")
+    store.delete("a")
+    assert store._bytes == 0
+
+
+def test_directory_store_leaves_other_files_alone(tmp_path):
+    (tmp_path / "notes.txt").write_bytes(b"not a cache entry")
+    store = DirectoryBackend(str(tmp_path), max_bytes=4)
+    store.set("a", b"1234")
+    store.set("b", b"1234")
+    assert (tmp_path / "notes.txt").read_bytes() == b"not a cache entry"
+    assert store.get("a") is None
+    assert store.get("b") == b"1234"
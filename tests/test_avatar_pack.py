@@ -0,0 +1,38 @@
+import pytest
+
+from src import avatar_pack
+from src.avatar_cache import render_key
+from src.avatar_pack import AvatarPack, render_default, write_pack
+from src.color import pick_stable_random
+
+
+def test_pack_serves_written_avatars(tmp_path):
+    path = str(tmp_path / "avatars.pack")
+    write_pack(path, {"a": b"first", "b": b"second avatar"})
+
+    pack = AvatarPack(path)
+    assert len(pack) == 2
+    assert pack.get("b") == b"second avatar"
+    assert pack.get("a") == b"first"
+    assert pack.get("c") is None
+    assert pack.stats()["hits"] == 2
+    assert pack.stats()["misses"] == 1
+    pack.close()
+
+
+def test_default_avatar_is_keyed_like_the_bot():
+    key, data = render_default("[F23] Operating Systems Students")
+    assert key == render_key("Operating Systems", "F23", pick_stable_random("Operating Systems"))
+    assert data.startswith(b"\xff\xd8")
+
+
+def test_stale_pack_is_rejected(tmp_path, monkeypatch):
+    path = str(tmp_path / "avatars.pack")
+    write_pack(path, {"a": b"first"})
+    monkeypatch.setattr(avatar_pack, "RENDERER_VERSION", avatar_pack.RENDERER_VERSION + 1)
+    with pytest.raises(ValueError, match="stale"):
+        AvatarPack(path)
+
+    (tmp_path / "garbage.pack").write_bytes(b"not a pack at all")
+    with pytest.raises(ValueError, match="not an avatar pack"):
+        AvatarPack(str(tmp_path / "garbage.pack"))
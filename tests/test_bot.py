@@ -0,0 +1,23 @@
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("TELEGRAM_API_TOKEN", "123456:test")
+os.environ["CHAT_REGISTRY_PATH"] = os.path.join(tempfile.mkdtemp(), "chat_registry.sqlite3")
+os.environ.pop("AVATAR_PACK_PATH", None)
+
+from src import bot
+
+
+def test_set_photo_callback_reads_final_avatar_rendered_after_preview(monkeypatch):
+    async def scenario():
+        await bot._prerender_final("Databases", "F25", (1, 2, 3))
+
+        async def render_again(*args, **kwargs):
+            raise AssertionError("the final avatar was rendered again")
+
+        monkeypatch.setattr(bot.render_pool, "run", render_again)
+        # What handle_set_image_callback does once the button is pressed
+        return await bot._get_avatar_bytes("Databases", "F25", (1, 2, 3))
+
+    assert asyncio.run(scenario()).startswith(b"\xff\xd8")
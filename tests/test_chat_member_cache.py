@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.enums import ChatMemberStatus
+
+from src.chat_member_cache import ChatMemberCache
+
+
+class FakeBot:
+    def __init__(self):
+        self.get_chat_member_calls = 0
+        self.get_chat_administrators_calls = 0
+
+    async def get_chat_member(self, chat_id: int, user_id: int):
+        self.get_chat_member_calls += 1
+        status = ChatMemberStatus.ADMINISTRATOR if user_id == 1 else ChatMemberStatus.MEMBER
+        return SimpleNamespace(status=status, user=SimpleNamespace(id=user_id))
+
+    async def get_chat_administrators(self, chat_id: int):
+        self.get_chat_administrators_calls += 1
+        return [SimpleNamespace(status=ChatMemberStatus.CREATOR, user=SimpleNamespace(id=1))]
+
+
+def test_status_is_cached_until_ttl_expires():
+    bot = FakeBot()
+
+    async def scenario():
+        cache = ChatMemberCache(bot, ttl=60)  # type: ignore[arg-type]
+        assert await cache.is_admin(-100, 1)
+        assert await cache.is_admin(-100, 1)
+        assert not await cache.is_admin(-100, 2)
+        cache.ttl = 0
+        cache.invalidate(-100, 1)
+        assert await cache.is_admin(-100, 1)
+        assert await cache.is_admin(-100, 1)
+
+    asyncio.run(scenario())
+    assert bot.get_chat_member_calls == 4
+
+
+def test_updates_override_cached_status():
+    bot = FakeBot()
+
+    async def scenario():
+        cache = ChatMemberCache(bot)  # type: ignore[arg-type]
+        assert await cache.is_admin(-100, 1)
+        cache.update(-100, 1, ChatMemberStatus.MEMBER)
+        assert not await cache.is_admin(-100, 1)
+
+    asyncio.run(scenario())
+    assert bot.get_chat_member_calls == 1
+
+
+def test_admin_preload_answers_every_member_with_one_request():
+    bot = FakeBot()
+
+    async def scenario():
+        cache = ChatMemberCache(bot, preload_admins=True)  # type: ignore[arg-type]
+        assert await cache.is_admin(-100, 1)
+        assert not await cache.is_admin(-100, 2)
+        assert not await cache.is_admin(-100, 3)
+
+    asyncio.run(scenario())
+    assert bot.get_chat_administrators_calls == 1
+    assert bot.get_chat_member_calls == 0
+
+
+def test_admin_preload_without_caching_still_answers():
+    bot = FakeBot()
+
+    async def scenario():
+        cache = ChatMemberCache(bot, ttl=0, preload_admins=True)  # type: ignore[arg-type]
+        assert await cache.is_admin(-100, 1)
+        assert not await cache.is_admin(-100, 2)
+        assert await cache.is_admin(-100, 1)
+
+    asyncio.run(scenario())
+    assert bot.get_chat_administrators_calls == 3
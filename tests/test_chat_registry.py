@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.enums import ChatMemberStatus
+from aiogram.types import Chat, Message, PhotoSize, User
+
+from src.chat_registry import ChatRegistry, ChatRegistryMiddleware
+
+
+def test_chats_are_persisted_with_parsed_title(tmp_path):
+    path = str(tmp_path / "data" / "chats.sqlite3")
+
+    async def scenario():
+        registry = ChatRegistry(path)
+        await registry.update(-100, title="[F25] Philosophy Students", bot_status=ChatMemberStatus.ADMINISTRATOR)
+        await registry.update(-100, has_photo=True, avatar_key="abc")
+        registry.close()
+
+    asyncio.run(scenario())
+    record = ChatRegistry(path).get(-100)
+    assert record is not None
+    assert record.title == "[F25] Philosophy Students"
+    assert record.course == "Philosophy"
+    assert record.semester == "F25"
+    assert record.bot_status == "administrator"
+    assert record.has_photo is True
+    assert record.avatar_key == "abc"
+
+
+def test_middleware_records_title_and_photo_changes(tmp_path):
+    registry = ChatRegistry(str(tmp_path / "chats.sqlite3"))
+    chat = Chat(id=-100, type="supergroup", title="[S25] Physics")
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.message_id)
+
+    async def scenario():
+        middleware = ChatRegistryMiddleware(registry)
+        data = {"bot": SimpleNamespace(id=42)}
+        await middleware(handler, Message(message_id=1, date=0, chat=chat, text="hi"), data)
+        photo = PhotoSize(file_id="photo", file_unique_id="unique", width=640, height=640)
+        await registry.update(-100, avatar_key="default")
+        bot_user = User(id=42, is_bot=True, first_name="Bot")
+        await middleware(
+            handler, Message(message_id=2, date=0, chat=chat, from_user=bot_user, new_chat_photo=[photo]), data
+        )
+        record = registry.get(-100)
+        assert record is not None and record.has_photo and record.photo_file_id == "photo"
+        assert record.avatar_key == "default"
+        person = User(id=1, is_bot=False, first_name="Admin")
+        await middleware(
+            handler, Message(message_id=3, date=0, chat=chat, from_user=person, new_chat_photo=[photo]), data
+        )
+        assert registry.get(-100).avatar_key is None  # type: ignore[union-attr]
+        await middleware(handler, Message(message_id=4, date=0, chat=chat, delete_chat_photo=True), data)
+
+    asyncio.run(scenario())
+    record = registry.get(-100)
+    assert handled == [1, 2, 3, 4]
+    assert record is not None
+    assert record.course == "Physics"
+    assert record.has_photo is False
+    assert record.photo_file_id is None
+
+
+def test_writes_of_other_processes_are_not_overwritten(tmp_path):
+    path = str(tmp_path / "chats.sqlite3")
+
+    async def scenario():
+        bot_registry = ChatRegistry(path)
+        await bot_registry.update(-100, title="[F25] Physics", avatar_key="old")
+        cli_registry = ChatRegistry(path)
+        await cli_registry.update(-100, avatar_key="new")
+        await bot_registry.update(-100, bot_status=ChatMemberStatus.ADMINISTRATOR)
+        assert bot_registry.get(-100).avatar_key == "old"  # type: ignore[union-attr]
+        assert (await bot_registry.load(-100)).avatar_key == "new"  # type: ignore[union-attr]
+
+    asyncio.run(scenario())
+    record = ChatRegistry(path).get(-100)
+    assert record is not None
+    assert record.title == "[F25] Physics"
+    assert record.avatar_key == "new"
+    assert record.bot_status == "administrator"
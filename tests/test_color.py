@@ -0,0 +1,11 @@
+import pytest
+
+from src.color import parse_hex_color
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [("#ff0080", (255, 0, 128)), ("0A0b0C", (10, 11, 12)), ("-1-1-1", None), ("#fff", None), ("#ff008000", None)],
+)
+def test_parse_hex_color(value: str, expected: tuple[int, int, int] | None):
+    assert parse_hex_color(value) == expected
@@ -0,0 +1,58 @@
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import DeleteMessages
+
+from src.deletion_queue import DeletionQueue
+
+
+class FakeBot:
+    def __init__(self, fail_bulk: bool = False, retry_after_once: bool = False):
+        self.fail_bulk = fail_bulk
+        self.retry_after_once = retry_after_once
+        self.bulk_calls: list[tuple[int, list[int]]] = []
+        self.single_calls: list[tuple[int, int]] = []
+
+    async def delete_messages(self, chat_id: int, message_ids: list[int]) -> bool:
+        method = DeleteMessages(chat_id=chat_id, message_ids=message_ids)
+        if self.retry_after_once:
+            self.retry_after_once = False
+            raise TelegramRetryAfter(method, "Too Many Requests", 0)
+        if self.fail_bulk:
+            raise TelegramBadRequest(method, "Bad Request")
+        self.bulk_calls.append((chat_id, message_ids))
+        return True
+
+    async def delete_message(self, chat_id: int, message_id: int) -> bool:
+        self.single_calls.append((chat_id, message_id))
+        return True
+
+
+def test_deletions_are_coalesced_per_chat_and_chunked():
+    bot = FakeBot()
+
+    async def scenario():
+        queue = DeletionQueue(bot, window=0.01)  # type: ignore[arg-type]
+        for message_id in range(150):
+            queue.add(1, message_id)
+        queue.add(2, 7)
+        await asyncio.sleep(0.05)
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert bot.bulk_calls == [(1, list(range(100))), (1, list(range(100, 150))), (2, [7])]
+    assert queue.stats()["flushes"] == 2
+    assert queue.stats()["deleted"] == 151
+
+
+def test_falls_back_to_single_deletes_when_bulk_delete_fails():
+    bot = FakeBot(fail_bulk=True, retry_after_once=True)
+
+    async def scenario():
+        queue = DeletionQueue(bot, window=10)  # type: ignore[arg-type]
+        queue.add(1, 1)
+        queue.add(1, 2)
+        await queue.close()
+
+    asyncio.run(scenario())
+    assert bot.single_calls == [(1, 1), (1, 2)]
@@ -0,0 +1,23 @@
+from src.metrics import Counter, Histogram, Registry
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests", ("method",)))
+    latency = registry.register(Histogram("latency_seconds", "Latency", ("method",), buckets=(0.1, 1.0)))
+    registry.register_stats("cache", lambda: {"hits": 3, "kind": "memory"})
+
+    requests.inc(method="getChat")
+    requests.inc(2, method="getChat")
+    latency.observe(0.05, method="getChat")
+    latency.observe(0.5, method="getChat")
+    latency.observe(5, method="getChat")
+
+    lines = registry.collect().splitlines()
+    assert 'requests_total{method="getChat"} 3.0' in lines
+    assert 'latency_seconds_bucket{method="getChat",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{method="getChat",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{method="getChat",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{method="getChat"} 3' in lines
+    assert "cache_hits 3" in lines
+    assert not any(line.startswith("cache_kind") for line in lines)
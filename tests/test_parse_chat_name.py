@@ -2,7 +2,7 @@ from unittest import TestCase
 
 import pytest
 
-from src.parse_chat_name import get_course_name
+from src.parse_chat_name import ChatNameParser, get_course_name, get_semester
 
 cases_course_groups = [
     ("[S24] Databases", "Databases"),
@@ -83,3 +83,18 @@ def test_location_parser(input_, desired: str):
 
     course_name = get_course_name(input_)
     assert course_name == desired
+
+
+def test_parser_batch_matches_single_calls():
+    parser = ChatNameParser()
+    names = [name for name, _ in cases_course_groups]
+    parsed = parser.parse_many(names)
+    assert [p.course for p in parsed] == [course for _, course in cases_course_groups]
+    assert [p.semester for p in parsed] == [get_semester(name) for name in names]
+    assert parser.parse.cache_info().hits == len(names) - len(set(names))
+
+
+def test_parser_suffixes_are_configurable():
+    parser = ChatNameParser(suffixes=("Students", "Chat"))
+    assert parser.parse("[F25] Calculus Chat") == ("Calculus", "F25")
+    assert ChatNameParser(suffixes=()).parse("[F23] Networks Students").course == "Networks Students"
@@ -0,0 +1,53 @@
+import asyncio
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import DeleteMessage, SendMessage, SetChatPhoto
+from aiogram.types import BufferedInputFile
+
+from src.rate_limit import Priority, PriorityTokenBucket, RateLimitMiddleware
+
+
+def test_bucket_releases_higher_priority_first():
+    order: list[str] = []
+
+    async def take(bucket: PriorityTokenBucket, name: str, priority: Priority):
+        await bucket.acquire(priority)
+        order.append(name)
+
+    async def scenario():
+        bucket = PriorityTokenBucket(rate=100, burst=1)
+        await bucket.acquire()
+        await asyncio.gather(
+            take(bucket, "upload", Priority.LOW),
+            take(bucket, "lookup", Priority.NORMAL),
+            take(bucket, "delete", Priority.HIGH),
+        )
+
+    asyncio.run(scenario())
+    assert order == ["delete", "lookup", "upload"]
+
+
+def test_middleware_retries_after_flood_limit_and_records_waits():
+    calls: list[str] = []
+
+    async def make_request(bot, method):
+        calls.append(method.__api_method__)
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method, "Too Many Requests", 0)
+        return True
+
+    async def scenario():
+        middleware = RateLimitMiddleware()
+        assert await middleware(make_request, None, DeleteMessage(chat_id=1, message_id=1))  # type: ignore[arg-type]
+        await middleware(make_request, None, SendMessage(chat_id=1, text="hi"))  # type: ignore[arg-type]
+        await middleware(
+            make_request,
+            None,  # type: ignore[arg-type]
+            SetChatPhoto(chat_id=1, photo=BufferedInputFile(b"", "avatar.jpeg")),
+        )
+        return middleware
+
+    middleware = asyncio.run(scenario())
+    assert calls == ["deleteMessage", "deleteMessage", "sendMessage", "setChatPhoto"]
+    assert middleware.retries == 1
+    assert middleware.stats()["deleteMessage_count"] == 2
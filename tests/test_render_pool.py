@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.render_pool import RenderPool, RenderPoolBusy
+
+
+def test_render_pool_runs_job():
+    async def scenario():
+        pool = RenderPool(max_workers=1, max_queue=1)
+        try:
+            assert await pool.run(pow, 2, 10) == 1024
+            assert pool.stats()["pending"] == 0
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_render_pool_rejects_when_saturated():
+    release = threading.Event()
+
+    async def scenario():
+        pool = RenderPool(max_workers=1, max_queue=1)
+        try:
+            jobs = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            assert pool.queue_depth == 1
+            with pytest.raises(RenderPoolBusy):
+                await pool.run(release.wait)
+            release.set()
+            await asyncio.gather(*jobs)
+            assert pool.stats()["rejected"] == 1
+        finally:
+            release.set()
+            pool.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,63 @@
+import asyncio
+import queue
+
+from aiogram.types import Update
+
+from src.sharding import ChatSerializer, UpdateForwarder, shard_for, update_chat_id
+from tests.test_webhook import recorded_update
+
+
+def test_update_is_routed_by_chat_id_after_serialization():
+    update = Update.model_validate(recorded_update)
+    restored = Update.model_validate_json(update.model_dump_json(exclude_unset=True))
+    assert update_chat_id(restored) == -100
+    assert shard_for(-100, 4) == shard_for(update_chat_id(update), 4)
+    assert 0 <= shard_for(-100, 4) < 4
+
+
+def test_chat_serializer_keeps_order_within_chat():
+    events: list[tuple[int, int]] = []
+
+    def job(chat_id: int, number: int, delay: float):
+        async def run():
+            await asyncio.sleep(delay)
+            events.append((chat_id, number))
+
+        return run
+
+    async def scenario():
+        serializer = ChatSerializer()
+        serializer.submit(1, job(1, 1, 0.02))
+        serializer.submit(1, job(1, 2, 0))
+        serializer.submit(2, job(2, 1, 0))
+        await serializer.join()
+
+    asyncio.run(scenario())
+    assert events == [(2, 1), (1, 1), (1, 2)]
+
+
+def _update(update_id: int, chat_id: int) -> Update:
+    message = {**recorded_update["message"], "chat": {**recorded_update["message"]["chat"], "id": chat_id}}
+    return Update.model_validate({"update_id": update_id, "message": message})
+
+
+def test_full_shard_does_not_hold_up_other_shards():
+    busy: queue.Queue[str] = queue.Queue(maxsize=1)
+    idle: queue.Queue[str] = queue.Queue()
+
+    async def scenario():
+        forwarder = UpdateForwarder([busy, idle])  # type: ignore[list-item]
+        for update_id in (1, 2, 3):
+            await forwarder.put(_update(update_id, -100))
+        await forwarder.put(_update(4, -101))
+        forwarded = await asyncio.get_running_loop().run_in_executor(None, idle.get, True, 5)
+        assert Update.model_validate_json(forwarded).update_id == 4
+
+        # The worker of the busy shard catches up, everything buffered is handed over before closing
+        drained = []
+        while len(drained) < 3:
+            drained.append(await asyncio.get_running_loop().run_in_executor(None, busy.get, True, 5))
+        await forwarder.close()
+        return [Update.model_validate_json(data).update_id for data in drained]
+
+    assert asyncio.run(scenario()) == [1, 2, 3]
@@ -0,0 +1,43 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher, types
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.webhook import create_webhook_app
+
+recorded_update = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": -100, "type": "supergroup", "title": "[F24] Databases"},
+        "from": {"id": 1, "is_bot": False, "first_name": "Student"},
+        "text": "hello",
+    },
+}
+
+
+def test_webhook_checks_secret_and_dispatches_update():
+    received: list[int] = []
+    dp = Dispatcher()
+
+    @dp.message()
+    async def handler(message: types.Message):
+        received.append(message.message_id)
+
+    async def scenario():
+        bot = Bot("123:abc")
+        app = create_webhook_app(dp, bot, "/webhook", "secret")
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post("/webhook", json=recorded_update)
+            assert response.status == 401
+
+            response = await client.post(
+                "/webhook", json=recorded_update, headers={"X-Telegram-Bot-Api-Secret-Token": "secret"}
+            )
+            assert response.status == 200
+            await asyncio.sleep(0.05)
+        await bot.session.close()
+
+    asyncio.run(scenario())
+    assert received == [10]